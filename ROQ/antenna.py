@@ -0,0 +1,153 @@
+"""
+Vectorised detector antenna pattern responses.
+
+The response of a detector to the plus and cross polarisations can be written
+as (see, e.g., XLALComputeDetAMResponse)
+
+  F+ = a(t) cos(2 psi) + b(t) sin(2 psi),
+  Fx = b(t) cos(2 psi) - a(t) sin(2 psi),
+
+where a(t) and b(t) only depend on the detector, the source sky position and
+the sidereal time. So, a(t) and b(t) are calculated once for a given time
+series and sky position and cached, and the responses for any polarisation
+angle (or array of polarisation angles) are then just a rotation of them.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+import lal
+
+
+# detector names and their LAL cached detector indices (as used by pulsarpputils)
+detmap = {'H1': lal.LALDetectorIndexLHODIFF,
+          'H2': lal.LALDetectorIndexLHODIFF,
+          'L1': lal.LALDetectorIndexLLODIFF,
+          'G1': lal.LALDetectorIndexGEO600DIFF,
+          'V1': lal.LALDetectorIndexVIRGODIFF,
+          'T1': lal.LALDetectorIndexTAMA300DIFF}
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def greenwich_mean_sidereal_time(t):
+    """Greenwich mean sidereal time (rads) for an array of GPS times"""
+    t = np.atleast_1d(np.asarray(t, dtype=float))
+    return np.array([lal.GreenwichMeanSiderealTime(lal.LIGOTimeGPS(tv)) for tv in t])
+
+
+class AntennaResponse(object):
+    """
+    Calculate the antenna pattern responses of a given detector for whole
+    arrays of times.
+
+    Args:
+        det (str): the detector name, e.g. 'H1'
+        cachesize (int): the number of sidereal time series, and of a(t) and
+            b(t) terms, to keep cached
+
+    The sidereal time series for each time array, and the polarisation angle
+    independent a(t) and b(t) terms for each sky position and time array, are
+    cached, so only the first call for a given (ra, dec, time series) does any
+    trigonometry over the time series. The caches only keep the most recently
+    used cachesize entries, so they do not grow without limit if, e.g., a
+    sampler varies the sky position.
+    """
+
+    def __init__(self, det, cachesize=16):
+        try:
+            detector = detmap[det]
+        except KeyError:
+            raise KeyError("Key %s is not a valid detector name." % det)
+
+        self.det = det
+        self.response = np.array(lal.CachedDetectors[detector].response, dtype=float)
+
+        self.cachesize = cachesize
+        self._gmst_cache = OrderedDict()
+        self._ab_cache = OrderedDict()
+
+    @staticmethod
+    def _time_key(t):
+        return (len(t), t[0], t[-1], hash(t.tobytes()))
+
+    def _cached(self, cache, key, func, *args):
+        # get a value from a least recently used cache, calculating it with func(*args) if needed
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        value = cache[key] = func(*args)
+        if len(cache) > self.cachesize:
+            cache.popitem(last=False)
+        return value
+
+    def gmst(self, t):
+        """The (cached) Greenwich mean sidereal times for the array of times t"""
+        t = np.atleast_1d(np.asarray(t, dtype=float))
+        return self._cached(self._gmst_cache, self._time_key(t), greenwich_mean_sidereal_time, t)
+
+    def sidereal_terms(self, t, ra, dec):
+        """
+        The (cached) polarisation angle independent terms a(t) and b(t) for a
+        source at right ascension ra and declination dec (both in rads).
+        """
+
+        t = np.atleast_1d(np.asarray(t, dtype=float))
+        key = (float(ra), float(dec), self._time_key(t))
+        return self._cached(self._ab_cache, key, self._sidereal_terms, t, ra, dec)
+
+    def _sidereal_terms(self, t, ra, dec):
+        gha = self.gmst(t) - ra # Greenwich hour angle of source
+        cosgha = np.cos(gha)
+        singha = np.sin(gha)
+        cosdec = np.cos(dec)
+        sindec = np.sin(dec)
+
+        # the X and Y vectors of XLALComputeDetAMResponse at psi = 0 (u) and psi = pi/2 (v)
+        u = np.column_stack((-singha, -cosgha, np.zeros_like(gha)))
+        v = np.column_stack((-cosgha*sindec, singha*sindec, np.full_like(gha, cosdec)))
+
+        Du = np.dot(u, self.response)
+        Dv = np.dot(v, self.response)
+        a = np.einsum('ij,ij->i', u, Du) - np.einsum('ij,ij->i', v, Dv)
+        b = 2.*np.einsum('ij,ij->i', u, Dv)
+
+        return a, b
+
+    def __call__(self, t, ra, dec, psi):
+        """
+        Get the plus and cross antenna responses at times t for a source at
+        right ascension ra, declination dec and polarisation angle psi (all in
+        rads). If psi is a 1D array (or an n x 1 column array) the responses are
+        returned as n x len(t) arrays, with a row for each polarisation angle.
+        """
+
+        a, b = self.sidereal_terms(t, ra, dec)
+
+        psi = np.asarray(psi, dtype=float)
+        if psi.ndim == 1:
+            psi = psi[:, np.newaxis]
+
+        ctwopsi = np.cos(2.*psi)
+        stwopsi = np.sin(2.*psi)
+
+        fp = a*ctwopsi + b*stwopsi
+        fc = b*ctwopsi - a*stwopsi
+
+        return fp, fc
+
+
+_responses = {}
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def antenna_response(t, ra, dec, psi, det):
+    """
+    A vectorised version of pulsarpputils.antenna_response, returning the plus
+    and cross responses for a whole array of times t (and, optionally, an array
+    of polarisation angles psi) in one call.
+    """
+
+    if det not in _responses:
+        _responses[det] = AntennaResponse(det)
+    return _responses[det](t, ra, dec, psi)
@@ -0,0 +1,81 @@
+"""
+Interchangeable NumPy and C (GSL) implementations of the reduced order
+quadrature building blocks, so that a pipeline can choose which to use, e.g.
+
+>>> backend = get_backend("c")
+>>> RB = backend.create_basis(TS, dt, 1e-12)
+>>> B, nodes = backend.create_interpolant(RB)
+"""
+
+import numpy as np
+
+from misc import empirical_interpolant
+from greedy import GreedyReducedBasis
+
+
+class NumpyBackend(object):
+    """The pure Python/NumPy implementations"""
+
+    name = "numpy"
+
+    def create_basis(self, TS, weights, tolerance=1e-12):
+        """Create a reduced basis from a training set"""
+        return GreedyReducedBasis(weights, tolerance=tolerance).build(TS)
+
+    def create_interpolant(self, RB):
+        """Create the empirical interpolant B matrix and nodes for a reduced basis"""
+        B, nodes, _ = empirical_interpolant(RB)
+        return B, np.asarray(nodes)
+
+    def data_model_weights(self, B, data, weights):
+        """The ROQ data dot model weights"""
+        return np.dot(B, np.conj(data)*weights)
+
+    def model_model_weights(self, B, weights):
+        """The ROQ model dot model (quadratic) weights"""
+        return np.dot(np.conj(B)*weights, np.transpose(B))
+
+
+class CBackend(object):
+    """The GSL implementations in roq_test.c (real data and scalar weights only)"""
+
+    name = "c"
+
+    def __init__(self):
+        import roqc
+        self.roqc = roqc
+        roqc.load_library()
+
+    @staticmethod
+    def _scalar(weights):
+        if np.ndim(weights) != 0:
+            raise ValueError("The C backend only supports scalar integration weights")
+        return float(weights)
+
+    def create_basis(self, TS, weights, tolerance=1e-12):
+        return self.roqc.create_basis(TS, self._scalar(weights), tolerance)
+
+    def create_interpolant(self, RB):
+        return self.roqc.create_interpolant(RB)
+
+    def data_model_weights(self, B, data, weights):
+        return self.roqc.create_data_model_weights(B, np.asarray(data)*self._scalar(weights))
+
+    def model_model_weights(self, B, weights):
+        return self.roqc.create_model_model_weights(B)*self._scalar(weights)
+
+
+BACKENDS = {"numpy": NumpyBackend, "c": CBackend}
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def get_backend(backend="numpy"):
+    """Get a backend by name ("numpy" or "c"), or return the backend if given one"""
+
+    if not isinstance(backend, str):
+        return backend
+
+    try:
+        return BACKENDS[backend.lower()]()
+    except KeyError:
+        raise ValueError("Unknown backend '%s', must be one of %s" % (backend, sorted(BACKENDS)))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+"""
+Headless accuracy and speed benchmarks of reduced order quadratures for the
+toy signal models (the sinusoid, phase-only, line and antenna pattern models
+from the toymodel scripts).
+
+For each model a reduced basis and empirical interpolant are built from a
+training set, and then, for a set of random validation waveforms, the
+projection errors onto the basis and the ROQ log-likelihoods (compared to the
+full log-likelihoods) are calculated. The results are written out as JSON, e.g.
+
+  ./benchmark.py --models sinusoid line --validation-size 1000 --output results.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from misc import empirical_interpolant
+from greedy import projection_errors, GreedyReducedBasis
+from likelihood import ROQLikelihood
+
+
+def sinusoid(t, f0, f1):
+    """A time domain sinusoid with frequency f0 and spin-down f1 (toymodel.py)"""
+    return np.sin(2*np.pi*(f0*t + 0.5*f1*t**2))
+
+
+def phase(t, phi0):
+    """A sinusoid of one cycle per day with initial phase phi0 (toymodel_phase.py)"""
+    return np.sin(2*np.pi*(t/86400.) + phi0)
+
+
+def line(t, m, c):
+    """A line (toymodel_line.py)"""
+    return m*t + c
+
+
+def antenna(t, phi0, psi):
+    """A signal modulated by the H1 antenna pattern (toymodel_known.py)"""
+    from antenna import antenna_response
+
+    fps, fcs = antenna_response(t, 0., 0., psi, 'H1')
+    return fps*np.sin(phi0) + fcs*np.cos(phi0)
+
+
+# the models, their time stamps and prior ranges for each parameter
+MODELS = {'sinusoid': {'model': sinusoid,
+                       'times': np.linspace(0., 86400., 1440),
+                       'ranges': [(-0.001, 0.001), (-1e-9, 1e-9)]},
+          'phase': {'model': phase,
+                    'times': np.linspace(0., 86400., 1440),
+                    'ranges': [(0., 2.*np.pi)]},
+          'line': {'model': line,
+                   'times': np.linspace(0., 10., 20),
+                   'ranges': [(-10., -5.), (-10., -5.)]},
+          'antenna': {'model': antenna,
+                      'times': np.linspace(900000000., 900000000.+10.*86400., 300),
+                      'ranges': [(0., 2.*np.pi), (-np.pi/4., np.pi/4.)]}}
+
+
+def draw(ranges, size):
+    """Draw uniform random parameters (size x nparams) within the given ranges"""
+    return np.column_stack([np.random.uniform(low, high, size) for low, high in ranges])
+
+
+def waveforms(model, ts, samples, dt):
+    """Normalised waveforms for each row of a set of samples"""
+    H = np.atleast_2d(model(ts, *[samples[:,i:i+1] for i in range(samples.shape[1])]))
+    return H/np.sqrt(np.abs(np.sum(H*H, axis=1)*dt))[:,np.newaxis]
+
+
+def benchmark(name, ts_size=2000, validation_size=100, tolerance=1e-12, repeats=3):
+    """Run the benchmark for a given model returning a dictionary of results"""
+
+    model = MODELS[name]['model']
+    ts = MODELS[name]['times']
+    ranges = MODELS[name]['ranges']
+    dt = ts[1]-ts[0]
+
+    results = {'ts_size': ts_size, 'validation_size': validation_size,
+               'tolerance': tolerance, 'length': len(ts)}
+
+    # build the reduced basis
+    TS = waveforms(model, ts, draw(ranges, ts_size), dt)
+    greedy = GreedyReducedBasis(dt, tolerance=tolerance)
+    t0 = time.time()
+    RB = greedy.build(TS)
+    results['basis_time'] = time.time()-t0
+    results['nbases'] = len(RB)
+
+    # build the empirical interpolant
+    t0 = time.time()
+    B, nodes, info = empirical_interpolant(RB)
+    results['interpolant_time'] = time.time()-t0
+    results['nnodes'] = len(nodes)
+    results['interpolant_cond'] = float(info['cond'])
+    results['lebesgue_constant'] = float(info['lebesgue'])
+
+    # projection errors of the validation set
+    validation = draw(ranges, validation_size)
+    errors = projection_errors(dt, RB, waveforms(model, ts, validation, dt))
+    results['max_projection_error'] = float(np.max(errors))
+    results['median_projection_error'] = float(np.median(errors))
+
+    # compare ROQ and full likelihoods for data containing a signal
+    truth = draw(ranges, 1)[0]
+    data = model(ts, *truth) + np.random.randn(len(ts))
+    like = ROQLikelihood(B, nodes, data, dt, model, grid=ts)
+
+    roqtime, fulltime = [], []
+    for i in range(repeats):
+        t0 = time.time()
+        roq = like.log_likelihood(validation)
+        roqtime.append(time.time()-t0)
+
+        t0 = time.time()
+        full = like.full_log_likelihood(validation)
+        fulltime.append(time.time()-t0)
+
+    fracdiff = np.abs(roq-full)/np.abs(full)
+    results['roq_time_per_sample'] = min(roqtime)/validation_size
+    results['full_time_per_sample'] = min(fulltime)/validation_size
+    results['speedup'] = min(fulltime)/min(roqtime)
+    results['max_likelihood_fractional_error'] = float(np.max(fracdiff))
+    results['median_likelihood_fractional_error'] = float(np.median(fracdiff))
+
+    return results
+
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--models", nargs="+", default=sorted(MODELS), choices=sorted(MODELS), help="models to benchmark")
+parser.add_argument("--ts-size", type=int, default=2000, help="number of training waveforms [%(default)s]")
+parser.add_argument("--validation-size", type=int, default=100, help="number of validation waveforms [%(default)s]")
+parser.add_argument("--tolerance", type=float, default=1e-12, help="reduced basis tolerance [%(default)s]")
+parser.add_argument("--repeats", type=int, default=3, help="number of timing repeats [%(default)s]")
+parser.add_argument("--seed", type=int, default=None, help="random number generator seed")
+parser.add_argument("--output", default=None, help="output JSON file (defaults to stdout)")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        np.random.seed(args.seed)
+
+    output = {'python': platform.python_version(),
+              'numpy': np.__version__,
+              'platform': platform.platform(),
+              'date': time.strftime("%Y-%m-%dT%H:%M:%S"),
+              'models': {}}
+
+    for name in args.models:
+        try:
+            output['models'][name] = benchmark(name, ts_size=args.ts_size, validation_size=args.validation_size,
+                                               tolerance=args.tolerance, repeats=args.repeats)
+        except ImportError as e:
+            # e.g. the antenna pattern model requires LAL
+            output['models'][name] = {'skipped': str(e)}
+        sys.stderr.write("Finished %s\n" % name)
+
+    if args.output is None:
+        json.dump(output, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w") as fp:
+            json.dump(output, fp, indent=2)
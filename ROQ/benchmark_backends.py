@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""
+Script to compare the NumPy and C (GSL) backends for building a reduced order
+quadrature and evaluating likelihoods with it, using the sinusoid training set
+from roq_test.c.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from backends import get_backend
+
+
+def signalmodel(f0, t):
+    """
+    A sinusoid with frequency f0 evaluated at time stamps t.
+    """
+
+    return np.sin(2.*np.pi*f0*t)
+
+
+def timeit(func, *args):
+    t0 = time.time()
+    result = func(*args)
+    return result, time.time()-t0
+
+
+def run(backend, TS, ts, dt, tolerance, data, f0s):
+    backend = get_backend(backend)
+
+    timings = {}
+    RB, timings['basis'] = timeit(backend.create_basis, TS, dt, tolerance)
+    (B, nodes), timings['interpolant'] = timeit(backend.create_interpolant, RB)
+
+    (dmw, mmw), timings['weights'] = timeit(lambda: (backend.data_model_weights(B, data, dt), backend.model_model_weights(B, dt)))
+
+    # likelihoods for each frequency
+    t0 = time.time()
+    models = signalmodel(f0s[:,np.newaxis], ts[nodes])
+    if backend.name == "c":
+        roqc = backend.roqc
+        logl = np.array([roqc.roq_data_dot_model(dmw, model) - 0.5*roqc.roq_model_dot_model(mmw, model) for model in models])
+    else:
+        logl = np.dot(models, dmw) - 0.5*np.einsum('ij,ij->i', models, np.dot(models, mmw.T))
+    timings['likelihood'] = (time.time()-t0)/len(f0s)
+
+    return len(RB), logl, timings
+
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--ts-size", type=int, default=10, help="number of training waveforms [%(default)s]")
+parser.add_argument("--length", type=int, default=10000, help="length of each waveform [%(default)s]")
+parser.add_argument("--nsamples", type=int, default=10000, help="number of likelihood samples to time [%(default)s]")
+parser.add_argument("--tolerance", type=float, default=1e-12, help="reduced basis tolerance [%(default)s]")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    dt = 60.
+    ts = dt*np.arange(args.length)
+
+    # set up training set
+    fmin, fmax = -0.0001, 0.0001
+    TS = signalmodel(np.linspace(fmin, fmax, args.ts_size)[:,np.newaxis], ts)
+    TS /= np.sqrt(np.sum(TS*TS, axis=1)*dt)[:,np.newaxis]
+
+    data = np.random.randn(args.length)
+    f0s = np.random.rand(args.nsamples)*(fmax-fmin)+fmin
+
+    # full likelihood for comparison
+    models = signalmodel(f0s[:,np.newaxis], ts)
+    t0 = time.time()
+    loglfull = dt*(np.dot(models, data) - 0.5*np.sum(models*models, axis=1))
+    tfull = (time.time()-t0)/args.nsamples
+
+    print("%-8s %8s %12s %12s %12s %14s %10s" % ("backend", "nbases", "basis (s)", "interp (s)", "weights (s)", "like/sample (s)", "max frac. diff"))
+    for name in ["numpy", "c"]:
+        nbases, logl, timings = run(name, TS, ts, dt, args.tolerance, data, f0s)
+        fracdiff = np.max(np.abs(logl-loglfull)/np.abs(loglfull))
+        print("%-8s %8d %12.6f %12.6f %12.6f %14.3e %10.3e" % (name, nbases, timings['basis'], timings['interpolant'], timings['weights'], timings['likelihood'], fracdiff))
+
+    print("%-8s %8s %12s %12s %12s %14.3e" % ("full", "-", "-", "-", "-", tfull))
@@ -0,0 +1,336 @@
+"""
+Greedy reduced basis construction (Algorithm 1 of Field et al.
+arXiv:1308.3565v2).
+
+Rather than re-projecting the whole training set onto the full basis on every
+iteration (and forming a TS - projections residual matrix) the projection
+errors of each training waveform are updated incrementally, i.e.
+
+  sigma_i^(k) = <h_i, h_i> - sum_{j<=k} |<e_j, h_i>|^2,
+
+so each iteration only requires a single (BLAS backed) matrix-vector product of
+the training set with the newest basis vector.
+"""
+
+import multiprocessing
+import time
+
+import numpy as np
+
+from misc import dot_product
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def weighted_row_norms(weights, TS):
+    """Weighted squared norms <h_i, h_i> of each row of a training set"""
+    return np.real(np.einsum('ij,ij->i', TS.conj()*weights, TS))
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def projection_coefficients(weights, e, TS):
+    """Projection coefficients <e, h_i> of each row of a training set onto a basis vector e"""
+    return np.dot(TS, e.conj()*weights)
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def projection_errors(weights, RB, TS):
+    """
+    Projection errors of a set of waveforms (the rows of TS) onto a reduced basis
+    RB, i.e. the weighted squared norm of h_i minus its projection onto RB.
+    """
+    TS = np.atleast_2d(TS)
+    RB = np.atleast_2d(RB)
+    coeffs = np.dot(TS, (RB.conj()*weights).T) # len(TS) x len(RB) projection coefficients
+    residual = TS - np.dot(coeffs, RB)
+    return np.abs(weighted_row_norms(weights, residual))
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def iterchunks(TS, chunksize=None):
+    """
+    Iterate over a training set in chunks, yielding the index of the first
+    waveform in the chunk and the chunk itself. TS can either be an array (or
+    memory-mapped array), or an object (e.g. a :class:`trainingset.TrainingSet`)
+    providing its own iterchunks method.
+    """
+
+    if hasattr(TS, 'iterchunks'):
+        for start, chunk in TS.iterchunks():
+            yield start, chunk
+    else:
+        step = len(TS) if chunksize is None else int(chunksize)
+        for start in range(0, len(TS), step):
+            yield start, TS[start:start+step]
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def _greedy_worker(conn, shmname, shape, dtype, start, stop, weights, TS=None, chunksize=1000):
+    """
+    Worker process for :class:`ParallelGreedyReducedBasis`. This holds the
+    projection errors for the shard of the (shared memory) training set from
+    start to stop. If TS is given the shard is first filled in from it. Then
+    for each basis vector received the errors are updated and the largest error
+    in the shard, and its training set index, are sent back. The worker exits
+    when it receives None.
+    """
+
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(name=shmname)
+    try:
+        shard = np.ndarray(shape, dtype=dtype, buffer=shm.buf)[start:stop]
+
+        if TS is not None:
+            for i in range(0, len(shard), chunksize):
+                shard[i:i+chunksize] = TS[start+i:min(start+i+chunksize, stop)]
+
+        errors = weighted_row_norms(weights, shard)
+        conn.send(None) # signal that the shard is ready
+
+        while True:
+            e = conn.recv()
+            if e is None:
+                break
+
+            coeffs = projection_coefficients(weights, e, shard)
+            errors -= coeffs.real**2 + coeffs.imag**2
+
+            index = int(np.argmax(errors)) if len(errors) else 0
+            conn.send((abs(errors[index]) if len(errors) else -np.inf, start+index))
+
+        del shard
+    finally:
+        shm.close()
+        conn.close()
+
+
+class GreedyReducedBasis(object):
+    """
+    Build a reduced basis from a training set using the greedy algorithm.
+
+    Args:
+        weights (float or array): the integration weights used in the inner product
+            (e.g. dt, or df for frequency domain waveforms)
+        tolerance (float): the maximum allowed projection error
+        maxbases (int): an optional maximum number of basis vectors
+        chunksize (int): if given, array training sets are processed this
+            many waveforms at a time (training sets with their own
+            iterchunks method use their own chunk size)
+        verbose (bool): print out the largest projection error at each iteration
+
+    After calling :meth:`build` the following attributes are set:
+        basis: an (nbases x length) array of orthonormal basis vectors
+        greedy_points: the training set indices of the waveforms used to
+            create each basis vector
+        errors: the maximum projection error at each iteration (the first
+            value is 1, i.e. the error at the 0th iteration, and the last is
+            the final error, e.g. below the tolerance)
+        iteration_times: the wall-clock time (s) taken by each iteration
+    """
+
+    def __init__(self, weights, tolerance=1e-12, maxbases=None, chunksize=None, verbose=False):
+        self.weights = weights
+        self.tolerance = tolerance
+        self.maxbases = maxbases
+        self.chunksize = chunksize
+        self.verbose = verbose
+
+        self.basis = None
+        self.greedy_points = []
+        self.errors = []
+        self.iteration_times = []
+
+    def build(self, TS, seed=0):
+        """
+        Create the reduced basis from a training set TS, seeding it with the
+        waveform at index seed. TS can be a TS_size x length array of normalised
+        waveforms, or a :class:`trainingset.TrainingSet`, in which case the
+        training set is streamed in chunks and never held in memory in full.
+        """
+
+        if not hasattr(TS, 'iterchunks'):
+            TS = np.asarray(TS)
+        nts, length = TS.shape
+        maxbases = nts if self.maxbases is None else min(self.maxbases, nts)
+
+        # storage for the reduced basis (allocated in blocks as it grows)
+        RB = np.empty((min(maxbases, 64), length), dtype=TS.dtype)
+
+        self.greedy_points = [seed]
+        self.errors = [1.] # (2) of Algorithm 1. (projection error at 0th iteration)
+        self.iteration_times = []
+
+        try:
+            self._setup(TS)
+
+            # (3) of Algorithm 1. (seed greedy algorithm (arbitrary))
+            RB[0] = self._waveform(seed)
+            nbases = 1
+
+            while True: # (5) of Algorithm 1.
+                t0 = time.time()
+
+                # update the projection errors with the newest basis vector and
+                # find the training set waveform with the largest error
+                index, sigma = self._update_errors(RB[nbases-1]) # (7) of Algorithm 1.
+
+                if self.verbose:
+                    print("%.12e\t%d" % (sigma, nbases-1))
+
+                self.errors.append(sigma)
+
+                if sigma < self.tolerance or nbases == maxbases:
+                    self.iteration_times.append(time.time()-t0)
+                    break
+
+                self.greedy_points.append(index)
+
+                # Gram-Schmidt to get the next basis and normalize
+                worst = self._waveform(index)
+                next_basis = worst - np.dot(projection_coefficients(self.weights, worst, RB[:nbases]).conj(), RB[:nbases]) # (9) of Algorithm 1.
+                next_basis /= np.sqrt(abs(dot_product(self.weights, next_basis, next_basis))) # (10) of Alg 1. (normalize)
+
+                # (11) of Algorithm 1. (append reduced basis set)
+                if nbases == len(RB):
+                    RB = np.resize(RB, (min(2*len(RB), maxbases), length))
+                RB[nbases] = next_basis
+                nbases += 1
+
+                self.iteration_times.append(time.time()-t0)
+        finally:
+            self._teardown()
+
+        self.basis = RB[:nbases].copy()
+
+        return self.basis
+
+    def _setup(self, TS):
+        """Prepare the training set and the running projection errors"""
+        self._TS = TS
+        self._errors = None
+
+    def _waveform(self, index):
+        """Return the training set waveform at index"""
+        return np.asarray(self._TS[index])
+
+    def _update_errors(self, e):
+        """
+        Subtract the projections onto the new basis vector e from the running
+        projection errors and return the index and value of the largest error.
+        """
+
+        first = self._errors is None
+        if first:
+            self._errors = np.zeros(len(self._TS))
+
+        for start, chunk in iterchunks(self._TS, self.chunksize):
+            stop = start+len(chunk)
+            if first:
+                self._errors[start:stop] = weighted_row_norms(self.weights, chunk)
+            coeffs = projection_coefficients(self.weights, e, chunk)
+            self._errors[start:stop] -= coeffs.real**2 + coeffs.imag**2
+
+        index = int(np.argmax(self._errors))
+        return index, abs(self._errors[index])
+
+    def _teardown(self):
+        self._TS = None
+        self._errors = None
+
+    def __len__(self):
+        return 0 if self.basis is None else len(self.basis)
+
+
+class ParallelGreedyReducedBasis(GreedyReducedBasis):
+    """
+    Build a reduced basis from a training set using the greedy algorithm, with
+    the training set shared between a set of worker processes.
+
+    The training set is placed in shared memory and split into contiguous
+    shards, one per process. Each worker keeps the running projection errors
+    for its own shard, so on each iteration only the new basis vector is sent
+    to the workers and each returns just its largest error and its index.
+
+    Args:
+        weights (float or array): the integration weights used in the inner product
+        nprocs (int): the number of worker processes (defaults to the number
+            of CPUs)
+        start_method (str): the multiprocessing start method (defaults to
+            "fork" where available, so that signal models defined in scripts
+            can be used)
+
+    Other keyword arguments are as for :class:`GreedyReducedBasis`. If the
+    training set is a :class:`trainingset.TrainingSet` each worker generates
+    its own shard of it.
+    """
+
+    def __init__(self, weights, nprocs=None, start_method=None, **kwargs):
+        super(ParallelGreedyReducedBasis, self).__init__(weights, **kwargs)
+        self.nprocs = multiprocessing.cpu_count() if nprocs is None else int(nprocs)
+
+        if start_method is None and "fork" in multiprocessing.get_all_start_methods():
+            start_method = "fork"
+        self.start_method = start_method
+
+    def _setup(self, TS):
+        from multiprocessing import shared_memory
+
+        nts, length = TS.shape
+        dtype = np.dtype(TS.dtype)
+        generate = hasattr(TS, 'iterchunks')
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, nts*length*dtype.itemsize))
+        self._TS = np.ndarray((nts, length), dtype=dtype, buffer=self._shm.buf)
+        if not generate:
+            self._TS[:] = TS
+
+        ctx = multiprocessing.get_context(self.start_method)
+        self._workers = []
+        self._conns = []
+        bounds = np.linspace(0, nts, min(self.nprocs, nts)+1).astype(int)
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            parent, child = ctx.Pipe()
+            args = (child, self._shm.name, (nts, length), dtype, start, stop, self.weights)
+            if generate:
+                args += (TS, getattr(TS, 'chunksize', 1000))
+            proc = ctx.Process(target=_greedy_worker, args=args)
+            proc.daemon = True
+            proc.start()
+            child.close()
+            self._workers.append(proc)
+            self._conns.append(parent)
+
+        # wait for all shards to be ready
+        for conn in self._conns:
+            conn.recv()
+
+    def _waveform(self, index):
+        return self._TS[index].copy()
+
+    def _update_errors(self, e):
+        e = np.ascontiguousarray(e)
+        for conn in self._conns:
+            conn.send(e)
+
+        results = [conn.recv() for conn in self._conns]
+        sigma, index = max(results, key=lambda result: result[0])
+        return index, sigma
+
+    def _teardown(self):
+        for conn in getattr(self, '_conns', []):
+            try:
+                conn.send(None)
+            except (OSError, EOFError):
+                pass
+            conn.close()
+        for proc in getattr(self, '_workers', []):
+            proc.join()
+
+        self._conns = []
+        self._workers = []
+        self._TS = None
+
+        if getattr(self, '_shm', None) is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
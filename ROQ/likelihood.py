@@ -0,0 +1,140 @@
+"""
+A batched reduced order quadrature Gaussian likelihood.
+
+For a model h evaluated at the n empirical interpolation nodes the inner
+products with the data d, and with itself, are approximated by
+
+  <d, h> ~ w_d . h(nodes),  w_d = B (w d*)
+  <h, h> ~ h(nodes)^H G h(nodes),  G = B* diag(w) B^T
+
+where B is the (n x length) matrix from B_matrix/empirical_interpolant and w are
+the integration weights (the quadratic weights G are the weights created by
+create_model_model_weights in roq_test.c). Stacking the models for a set of
+samples into an (n_samples x n) matrix means both terms for every sample are
+then given by a couple of matrix products.
+"""
+
+import numpy as np
+
+from backends import get_backend
+
+
+class ROQLikelihood(object):
+    """
+    A Gaussian log-likelihood, -<d-h, d-h>/2, calculated with a reduced order
+    quadrature. Any noise variance should be folded into the integration
+    weights, e.g. weights = dt/sigma**2.
+
+    Args:
+        B (array): the (n x length) empirical interpolant B matrix
+        nodes (array): the n empirical interpolation node indices
+        data (array): the data (of the same length as the basis)
+        weights (float or array): the integration weights (e.g. dt or df)
+        model (callable): the signal model function, called as
+            model(x, *params), where x is an array of grid points and params
+            are the model parameters. For a batch of samples each parameter is
+            passed as an (n_samples x 1) column array and the model must then
+            return an (n_samples x len(x)) array.
+        grid (array): the time/frequency series the basis is defined on. The
+            model is evaluated at grid[nodes] (or at nodes if this is None).
+        rtol (float): the maximum fractional difference between the ROQ and
+            full log-likelihoods allowed by :meth:`validate`
+        backend (str): the backend ("numpy" or "c") used to calculate the
+            ROQ weights (see backends.get_backend)
+    """
+
+    def __init__(self, B, nodes, data, weights, model, grid=None, rtol=1e-5, backend="numpy"):
+        self.B = np.asarray(B)
+        self.nodes = np.asarray(nodes, dtype=int)
+        self.data = np.asarray(data)
+        self.weights = weights
+        self.model = model
+        self.grid = None if grid is None else np.asarray(grid)
+        self.rtol = rtol
+
+        if self.B.shape[0] != len(self.nodes):
+            raise ValueError("B matrix and nodes have inconsistent sizes")
+        if self.B.shape[1] != len(self.data):
+            raise ValueError("B matrix and data have inconsistent lengths")
+
+        self.node_points = self.nodes if self.grid is None else self.grid[self.nodes]
+
+        self.backend = get_backend(backend)
+
+        # data dot data
+        self.d_dot_d = np.real(np.vdot(self.data, self.data*self.weights))
+
+        # data dot model weights
+        self.dm_weights = self.backend.data_model_weights(self.B, self.data, self.weights)
+
+        # model dot model (quadratic) weights
+        self.mm_weights = self.backend.model_model_weights(self.B, self.weights)
+
+    @classmethod
+    def from_file(cls, roq, data, model, **kwargs):
+        """
+        Create the likelihood from a reduced order quadrature saved with
+        roqfile.save_roq (either the file name or the loaded ROQFile).
+        """
+
+        if not hasattr(roq, 'B'):
+            from roqfile import load_roq
+            roq = load_roq(roq)
+        return cls(roq.B, roq.nodes, data, roq.weights, model, grid=roq.grid, **kwargs)
+
+    def _columns(self, samples):
+        samples = np.atleast_2d(np.asarray(samples, dtype=float))
+        return [samples[:, i:i+1] for i in range(samples.shape[1])]
+
+    def model_at_nodes(self, samples):
+        """The (n_samples x n) array of models at the interpolation nodes"""
+        return np.atleast_2d(self.model(self.node_points, *self._columns(samples)))
+
+    def log_likelihood(self, samples):
+        """
+        The log-likelihood for an (n_samples x n_params) array of samples (or a
+        single set of n_params parameters).
+        """
+
+        single = np.ndim(samples) == 1
+        H = self.model_at_nodes(samples)
+
+        d_dot_h = np.real(np.dot(H, self.dm_weights))
+        h_dot_h = np.real(np.einsum('ij,ij->i', H.conj(), np.dot(H, self.mm_weights.T)))
+
+        logl = -0.5*(self.d_dot_d - 2.*d_dot_h + h_dot_h)
+        return logl[0] if single else logl
+
+    def full_log_likelihood(self, samples):
+        """
+        The log-likelihood calculated with the full inner products (requires
+        the grid to have been given).
+        """
+
+        if self.grid is None:
+            raise ValueError("The full likelihood requires the model grid")
+
+        single = np.ndim(samples) == 1
+        H = np.atleast_2d(self.model(self.grid, *self._columns(samples)))
+
+        residual = self.data - H
+        logl = -0.5*np.real(np.einsum('ij,ij->i', residual.conj()*self.weights, residual))
+        return logl[0] if single else logl
+
+    def validate(self, samples, rtol=None):
+        """
+        Check that the ROQ log-likelihood agrees with the full log-likelihood
+        for a set of samples, returning the maximum fractional difference.
+        A ValueError is raised if this is larger than rtol.
+        """
+
+        rtol = self.rtol if rtol is None else rtol
+
+        roq = np.atleast_1d(self.log_likelihood(samples))
+        full = np.atleast_1d(self.full_log_likelihood(samples))
+
+        fracdiff = np.max(np.abs(roq-full)/np.abs(full))
+        if fracdiff > rtol:
+            raise ValueError("ROQ log-likelihood differs from full log-likelihood by a fraction %e (> %e)" % (fracdiff, rtol))
+
+        return fracdiff
@@ -1,4 +1,5 @@
 import numpy as np
+from scipy.linalg import solve_triangular
 
 #!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
 def solarMassToSec(m):
@@ -61,9 +62,9 @@ def Mnu_to_Mc(M, nu):
 #!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
 def Mcnu_to_m1m2(Mc, nu):
 	"""Convert chirp mass, symmetric mass ratio pair to m1, m2"""
-	q = nu_to_q(nu)
-	M = Mcq_to_M(Mc, q)
-	return Mq_to_m1m2(M, q)
+	M = Mcnu_to_M(Mc, nu)
+	delta = nu_to_delta(nu)
+	return [0.5*M*(1.+delta), 0.5*M*(1.-delta)]
 
 #!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
 def m1m2_to_delta(m1, m2):
@@ -95,6 +96,126 @@ def X1X2_to_XsXa(X1, X2):
 	"""Convert dimensionless spins X1, X2 to symmetric and anti-symmetric spins Xs, Xa"""
 	return [X1X2_to_Xs(X1,X2), X1X2_to_Xa(X1,X2)]
 
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+# mass and spin parameters that can be converted between by convert_samples
+MASS_PARAMETERS = ['m1', 'm2', 'M', 'q', 'Mc', 'nu', 'delta']
+SPIN_PARAMETERS = ['X1', 'X2', 'Xs', 'Xa']
+
+def _mass_frame(cols, sl):
+	"""
+	Get the total mass M and relative mass difference delta for a slice of a set
+	of samples containing any pair of mass parameters that define m1 and m2.
+	"""
+	if 'm1' in cols and 'm2' in cols:
+		# cast to float, as the in-place operations below fail for integer samples
+		m1 = np.asarray(cols['m1'][sl], dtype=float)
+		m2 = np.asarray(cols['m2'][sl], dtype=float)
+		M = m1 + m2
+		delta = m1 - m2
+		delta /= M
+		return M, delta
+
+	if 'delta' in cols:
+		delta = np.array(cols['delta'][sl], dtype=float)
+	elif 'q' in cols:
+		q = np.asarray(cols['q'][sl], dtype=float)
+		delta = q - 1.
+		delta /= q + 1.
+	elif 'nu' in cols:
+		delta = 1. - 4.*np.asarray(cols['nu'][sl], dtype=float)
+		np.sqrt(delta, out=delta)
+	else:
+		raise KeyError("Samples require one of q, nu or delta (or m1 and m2)")
+
+	if 'M' in cols:
+		M = np.array(cols['M'][sl], dtype=float)
+	elif 'Mc' in cols:
+		# M = Mc nu^(-3/5), where nu = (1 - delta^2)/4
+		M = delta*delta
+		np.subtract(1., M, out=M)
+		M *= 0.25
+		M **= -3./5.
+		M *= cols['Mc'][sl]
+	else:
+		raise KeyError("Samples require one of M or Mc (or m1 and m2)")
+
+	return M, delta
+
+def _mass_target(name, M, delta, out):
+	"""Fill out with the mass parameter name calculated from M and delta"""
+	if name == 'M':
+		out[...] = M
+	elif name == 'delta':
+		out[...] = delta
+	elif name == 'm1':
+		np.add(1., delta, out=out)
+		out *= M
+		out *= 0.5
+	elif name == 'm2':
+		np.subtract(1., delta, out=out)
+		out *= M
+		out *= 0.5
+	elif name == 'q':
+		np.add(1., delta, out=out)
+		out /= 1. - delta
+	elif name in ['nu', 'Mc']:
+		np.multiply(delta, delta, out=out)
+		np.subtract(1., out, out=out)
+		out *= 0.25
+		if name == 'Mc':
+			out **= 3./5.
+			out *= M
+
+def _spin_target(name, cols, sl, out):
+	"""Fill out with the spin parameter name for a slice of a set of samples"""
+	if name in cols:
+		out[...] = cols[name][sl]
+	elif 'X1' in cols and 'X2' in cols and name in ['Xs', 'Xa']:
+		(np.add if name == 'Xs' else np.subtract)(cols['X1'][sl], cols['X2'][sl], out=out)
+		out *= 0.5
+	elif 'Xs' in cols and 'Xa' in cols and name in ['X1', 'X2']:
+		(np.add if name == 'X1' else np.subtract)(cols['Xs'][sl], cols['Xa'][sl], out=out)
+	else:
+		raise KeyError("Samples cannot be converted to %s" % name)
+
+def convert_samples(samples, targets, out=None, chunksize=65536):
+	"""
+	Convert a set of (e.g. posterior) samples to the parameters given in
+	targets. samples can be a structured array or a dictionary of arrays,
+	containing any pair of mass parameters (m1/m2, M or Mc with q, nu or delta)
+	and/or any pair of spin parameters (X1/X2 or Xs/Xa). The samples are
+	converted in chunks of chunksize in a single pass, writing the results
+	into out (a dictionary of arrays or a structured array), which is
+	allocated if not given and returned. If out is samples (i.e. the conversion
+	is done in place) any fields being converted to are not used as inputs.
+	"""
+	names = list(samples.keys()) if isinstance(samples, dict) else samples.dtype.names
+	cols = dict((name, samples[name]) for name in names if out is not samples or name not in targets)
+	nsamples = len(next(iter(cols.values())))
+
+	for name in targets:
+		if name not in MASS_PARAMETERS + SPIN_PARAMETERS:
+			raise KeyError("Unknown parameter %s" % name)
+
+	if out is None:
+		out = dict((name, np.empty(nsamples)) for name in targets)
+
+	massnames = [name for name in targets if name in MASS_PARAMETERS]
+	spinnames = [name for name in targets if name in SPIN_PARAMETERS]
+
+	for start in range(0, nsamples, chunksize):
+		sl = slice(start, min(start+chunksize, nsamples))
+
+		if len(massnames) > 0:
+			M, delta = _mass_frame(cols, sl)
+			for name in massnames:
+				_mass_target(name, M, delta, out[name][sl])
+
+		for name in spinnames:
+			_spin_target(name, cols, sl, out[name][sl])
+
+	return out
+
 #!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
 def fgwisco(Mtot):
 
@@ -120,9 +241,9 @@ def dot_product(weights, a, b):
 #!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
 def project_onto_basis(integration_weights, e, h, projections, proj_coefficients, iter):
 
-	for j in range(len(h)):
-		proj_coefficients[iter][j] = dot_product(integration_weights, e[iter], h[j])
-		projections[j] += proj_coefficients[iter][j]*e[iter]
+	# project all training waveforms onto the basis vector in one matrix-vector product
+	proj_coefficients[iter] = np.dot(h, np.conj(e[iter])*integration_weights)
+	projections += np.outer(proj_coefficients[iter], e[iter])
 	return projections
 
 #!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
@@ -139,4 +260,57 @@ def emp_interp(B_matrix, func, indices):
 
         interpolant = np.inner(func[indices].T, B_matrix.T)
 
-        return interpolant 
+        return interpolant
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def empirical_interpolant(e, verbose=False):
+	"""
+	Find the empirical interpolation nodes and B matrix for a reduced basis e
+	(Algorithm 2 of arXiv:1308.3565v2).
+
+	Rather than building and inverting the V matrix each time a node is added,
+	each basis vector's interpolation residual q_i (scaled to be 1 at its new
+	node) is kept. The matrix L_kj = q_j(node_k) is then unit lower triangular,
+	and is the L factor of an LU decomposition of V, so each interpolant only
+	needs an O(n^2) forward substitution and no explicit inverse is formed.
+
+	Returns the B matrix (as from B_matrix), the node indices, and a dictionary
+	with the absolute value of each new node's residual ("pivots"), the
+	condition number of the final V matrix ("cond") and the Lebesgue constant
+	of the interpolant ("lebesgue").
+	"""
+
+	e = np.atleast_2d(e)
+	nbases = len(e)
+
+	Q = np.zeros(e.shape, dtype=e.dtype) # scaled interpolation residuals
+	L = np.zeros((nbases, nbases), dtype=e.dtype)
+
+	# seed EIM algorithm
+	indices = [int(np.argmax(np.abs(e[0])))] # (2) of Algorithm 2
+	pivots = [e[0][indices[0]]]
+	Q[0] = e[0]/pivots[0]
+	L[0,0] = 1.
+
+	for i in range(1, nbases): # (4) of Algorithm 2
+		# coefficients of the empirical interpolant of e[i] (5 of Algorithm 2)
+		c = solve_triangular(L[:i,:i], e[i][indices], lower=True, unit_diagonal=True)
+		res = e[i] - np.dot(c, Q[:i]) # 6 of Algorithm 2
+
+		index = int(np.argmax(np.abs(res))) # 7 of Algorithm 2
+		if verbose:
+			print("%d: idx[%d]" % (i, index))
+
+		indices.append(index) # 8 of Algorithm 2
+		pivots.append(res[index])
+		Q[i] = res/res[index]
+		L[i,:i+1] = Q[:i+1,index]
+
+	# B = L^-T Q
+	B = solve_triangular(L, Q, trans='T', lower=True, unit_diagonal=True)
+
+	info = {'pivots': np.abs(pivots),
+	        'cond': np.linalg.cond(e[:,indices].T),
+	        'lebesgue': np.max(np.sum(np.abs(B), axis=0))}
+
+	return B, indices, info
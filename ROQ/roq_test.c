@@ -80,7 +80,7 @@ double *create_basis(double weight, double tolerance, gsl_matrix *TS, size_t *nb
   gsl_matrix_set_row(&RBview.matrix, 0, firstrow);
   gsl_vector_free(firstrow);
 
-  projection_errors = gsl_vector_calloc(dlength);
+  projection_errors = gsl_vector_calloc(nts);
   residual = gsl_matrix_calloc(nts, dlength);
   projections = gsl_matrix_calloc(nts, dlength);
   projection_coeffs = gsl_matrix_calloc(nts, nts);
@@ -89,6 +89,11 @@ double *create_basis(double weight, double tolerance, gsl_matrix *TS, size_t *nb
   while ( sigma >= tolerance ){
     if ( idx > nts-1 ){
       fprintf(stderr, "Not enough training models (%zu) to produce orthonormal basis given the tolerance of %le\n", nts, tolerance);
+      gsl_vector_free(projection_errors);
+      gsl_matrix_free(projection_coeffs);
+      gsl_matrix_free(residual);
+      gsl_matrix_free(projections);
+      free(RB);
       return NULL;
     }
 
@@ -139,11 +144,12 @@ double *create_basis(double weight, double tolerance, gsl_matrix *TS, size_t *nb
     gsl_vector_free(next_basis);
   }
 
-  *nbases = (size_t)idx;
+  *nbases = (size_t)idx+1; /* the basis has rows 0 to idx */
 
+  gsl_vector_free(projection_errors);
   gsl_matrix_free(projection_coeffs);
   gsl_matrix_free(residual);
-  gsl_matrix_free(TS);
+  gsl_matrix_free(projections);
 
   return RB;
 }
@@ -266,6 +272,8 @@ double roq_model_dot_model(gsl_matrix *weights, double *model){
   gsl_blas_dgemv(CblasTrans, 1.0, weights, &modelview.vector, 0., ws);
   gsl_blas_ddot(ws, &modelview.vector, &m_dot_m);
 
+  gsl_vector_free(ws);
+
   return m_dot_m;
 }
 
@@ -349,6 +357,7 @@ Interpolant *create_interpolant(gsl_matrix *RB){
   return interp;
 }
 
+#ifndef ROQ_LIBRARY
 int main(){
   gsl_matrix *TS; /* the training set of waveforms */
 
@@ -393,6 +402,8 @@ int main(){
     fprintf(stderr, "Error... problem producing basis\n");
     return 1;
   }
+
+  gsl_matrix_free(TS);
   
   gsl_matrix_view RBview = gsl_matrix_view_array(RB, nbases, wl);
 
@@ -480,3 +491,75 @@ int main(){
   
   return 0;
 }
+#endif
+
+/* Library interface: the functions below take and fill plain contiguous
+   (row-major) double arrays, so that they can be called (e.g. via ctypes)
+   directly on NumPy array buffers without any copying. Compile with
+   -DROQ_LIBRARY to build as a shared library without main(). */
+
+/* create a reduced basis from a nts x wl training set. The returned array of
+   nbases x wl bases must be freed with roq_free */
+double *roq_create_basis(double *ts, size_t nts, size_t wl, double weight, double tolerance, size_t *nbases){
+  gsl_matrix_view TSview = gsl_matrix_view_array(ts, nts, wl);
+
+  return create_basis(weight, tolerance, &TSview.matrix, nbases);
+}
+
+/* create the empirical interpolant of a nbases x wl reduced basis, filling in
+   the nbases interpolation nodes and the nbases x wl B matrix */
+int roq_create_interpolant(double *rb, size_t nbases, size_t wl, int *nodes, double *B){
+  gsl_matrix_view RBview = gsl_matrix_view_array(rb, nbases, wl);
+  gsl_matrix_view Bview = gsl_matrix_view_array(B, nbases, wl);
+  size_t i = 0;
+
+  Interpolant *interp = create_interpolant(&RBview.matrix);
+  if ( interp == NULL ){ return 1; }
+
+  for ( i=0; i<nbases; i++ ){ nodes[i] = interp->nodes[i]; }
+  gsl_matrix_memcpy(&Bview.matrix, interp->Bs);
+
+  gsl_matrix_free(interp->Bs);
+  free(interp->nodes);
+  free(interp);
+
+  return 0;
+}
+
+/* fill in the nbases data dot model weights for a nbases x wl B matrix */
+void roq_create_data_model_weights(double *B, size_t nbases, size_t wl, double *data, double *weights){
+  gsl_matrix_view Bview = gsl_matrix_view_array(B, nbases, wl);
+  gsl_vector_view wview = gsl_vector_view_array(weights, nbases);
+
+  gsl_vector *w = create_data_model_weights(&Bview.matrix, data);
+  gsl_vector_memcpy(&wview.vector, w);
+  gsl_vector_free(w);
+}
+
+/* fill in the nbases x nbases model dot model weights for a nbases x wl B matrix */
+void roq_create_model_model_weights(double *B, size_t nbases, size_t wl, double *weights){
+  gsl_matrix_view Bview = gsl_matrix_view_array(B, nbases, wl);
+  gsl_matrix_view wview = gsl_matrix_view_array(weights, nbases, nbases);
+
+  gsl_matrix *w = create_model_model_weights(&Bview.matrix);
+  gsl_matrix_memcpy(&wview.matrix, w);
+  gsl_matrix_free(w);
+}
+
+/* ROQ data dot model product for a model at the nbases interpolation nodes */
+double roq_data_dot_model_array(double *weights, size_t nbases, double *model){
+  gsl_vector_view wview = gsl_vector_view_array(weights, nbases);
+
+  return roq_data_dot_model(&wview.vector, model);
+}
+
+/* ROQ model dot model product for a model at the nbases interpolation nodes */
+double roq_model_dot_model_array(double *weights, size_t nbases, double *model){
+  gsl_matrix_view wview = gsl_matrix_view_array(weights, nbases, nbases);
+  return roq_model_dot_model(&wview.matrix, model);
+}
+
+/* free memory allocated by the library */
+void roq_free(void *ptr){
+  free(ptr);
+}
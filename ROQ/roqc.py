@@ -0,0 +1,203 @@
+"""
+ctypes bindings to the GSL reduced order quadrature routines in roq_test.c.
+
+The C code is compiled (with -DROQ_LIBRARY, so without its main() function)
+into a shared library, libroq.so, the first time it is needed. The library
+is built in a cache directory (given by the ROQ_CACHE environment variable,
+defaulting to ~/.cache/roq), rather than in the source tree, e.g.
+
+>>> import roqc
+>>> RB = roqc.create_basis(TS, dt, 1e-12)
+>>> B, nodes = roqc.create_interpolant(RB)
+
+Input arrays are passed to the C functions as pointers to their data, so no
+copies are made provided they are C-contiguous float64 arrays. The C routines
+only work with real valued data.
+"""
+
+import ctypes
+import os
+import subprocess
+
+import numpy as np
+
+
+ROQDIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(ROQDIR, "roq_test.c")
+CACHEDIR = os.environ.get("ROQ_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "roq"))
+LIBRARY = os.path.join(CACHEDIR, "libroq.so")
+
+_lib = None
+
+_double_p = ctypes.POINTER(ctypes.c_double)
+_int_p = ctypes.POINTER(ctypes.c_int)
+_size_t_p = ctypes.POINTER(ctypes.c_size_t)
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def build_library(output=LIBRARY, cc=None, cflags=None, ldflags=None):
+    """
+    Compile roq_test.c into a shared library. The compiler, and any extra
+    compiler/linker flags (e.g. the GSL include and library paths), default to
+    the CC, CFLAGS and LDFLAGS environment variables.
+    """
+
+    cc = os.environ.get("CC", "cc") if cc is None else cc
+    cflags = os.environ.get("CFLAGS", "").split() if cflags is None else list(cflags)
+    ldflags = os.environ.get("LDFLAGS", "").split() if ldflags is None else list(ldflags)
+
+    if os.path.dirname(output) and not os.path.isdir(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+
+    command = [cc, "-O2", "-shared", "-fPIC", "-DROQ_LIBRARY"] + cflags + [SOURCE, "-o", output] + ldflags + ["-lgsl", "-lgslcblas", "-lm"]
+    subprocess.check_call(command)
+
+    return output
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def load_library(path=LIBRARY, build=True):
+    """
+    Load the shared library (building it first if it does not exist, or is
+    older than roq_test.c, and build is True).
+    """
+
+    global _lib
+
+    if _lib is not None:
+        return _lib
+
+    if build and (not os.path.isfile(path) or os.path.getmtime(path) < os.path.getmtime(SOURCE)):
+        build_library(output=path)
+
+    lib = ctypes.CDLL(path)
+
+    lib.roq_create_basis.restype = _double_p
+    lib.roq_create_basis.argtypes = [_double_p, ctypes.c_size_t, ctypes.c_size_t, ctypes.c_double, ctypes.c_double, _size_t_p]
+
+    lib.roq_create_interpolant.restype = ctypes.c_int
+    lib.roq_create_interpolant.argtypes = [_double_p, ctypes.c_size_t, ctypes.c_size_t, _int_p, _double_p]
+
+    lib.roq_create_data_model_weights.restype = None
+    lib.roq_create_data_model_weights.argtypes = [_double_p, ctypes.c_size_t, ctypes.c_size_t, _double_p, _double_p]
+
+    lib.roq_create_model_model_weights.restype = None
+    lib.roq_create_model_model_weights.argtypes = [_double_p, ctypes.c_size_t, ctypes.c_size_t, _double_p]
+
+    lib.roq_data_dot_model_array.restype = ctypes.c_double
+    lib.roq_data_dot_model_array.argtypes = [_double_p, ctypes.c_size_t, _double_p]
+
+    lib.roq_model_dot_model_array.restype = ctypes.c_double
+    lib.roq_model_dot_model_array.argtypes = [_double_p, ctypes.c_size_t, _double_p]
+
+    lib.roq_free.restype = None
+    lib.roq_free.argtypes = [ctypes.c_void_p]
+
+    _lib = lib
+    return _lib
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def _as_double(array, ndim):
+    """Return a C-contiguous float64 version of an array (without copying if possible)"""
+    array = np.ascontiguousarray(array, dtype=np.float64)
+    if array.ndim != ndim:
+        raise ValueError("Expected a %d-dimensional array" % ndim)
+    return array
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def _ptr(array):
+    return array.ctypes.data_as(_double_p)
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def create_basis(TS, weight, tolerance=1e-12):
+    """
+    Create a reduced basis from a (normalised) TS_size x length training set
+    with the C greedy algorithm, using a scalar integration weight.
+    """
+
+    lib = load_library()
+    TS = _as_double(TS, 2)
+    nts, wl = TS.shape
+
+    nbases = ctypes.c_size_t(0)
+    rb = lib.roq_create_basis(_ptr(TS), nts, wl, float(weight), float(tolerance), ctypes.byref(nbases))
+    if not rb:
+        raise RuntimeError("Problem producing the reduced basis (not enough training models for the tolerance?)")
+
+    try:
+        RB = np.ctypeslib.as_array(rb, shape=(nbases.value, wl)).copy()
+    finally:
+        lib.roq_free(rb)
+
+    return RB
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def create_interpolant(RB):
+    """
+    Create the empirical interpolant of a reduced basis, returning the B
+    matrix and the interpolation node indices.
+    """
+
+    lib = load_library()
+    RB = _as_double(RB, 2)
+    nbases, wl = RB.shape
+
+    nodes = np.zeros(nbases, dtype=np.intc)
+    B = np.zeros((nbases, wl))
+    if lib.roq_create_interpolant(_ptr(RB), nbases, wl, nodes.ctypes.data_as(_int_p), _ptr(B)) != 0:
+        raise RuntimeError("Problem producing the empirical interpolant")
+
+    return B, nodes.astype(int)
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def create_data_model_weights(B, data):
+    """The ROQ data dot model weights B.data (fold any integration weights into data)"""
+
+    lib = load_library()
+    B = _as_double(B, 2)
+    data = _as_double(data, 1)
+    if len(data) != B.shape[1]:
+        raise ValueError("B matrix and data have inconsistent lengths")
+
+    weights = np.zeros(B.shape[0])
+    lib.roq_create_data_model_weights(_ptr(B), B.shape[0], B.shape[1], _ptr(data), _ptr(weights))
+    return weights
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def create_model_model_weights(B):
+    """The ROQ model dot model weights B.B^T"""
+
+    lib = load_library()
+    B = _as_double(B, 2)
+
+    weights = np.zeros((B.shape[0], B.shape[0]))
+    lib.roq_create_model_model_weights(_ptr(B), B.shape[0], B.shape[1], _ptr(weights))
+    return weights
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def roq_data_dot_model(weights, model):
+    """ROQ data dot model product for a model evaluated at the interpolation nodes"""
+
+    weights = _as_double(weights, 1)
+    model = _as_double(model, 1)
+    if len(model) != len(weights):
+        raise ValueError("Model and weights have inconsistent lengths")
+    return load_library().roq_data_dot_model_array(_ptr(weights), len(weights), _ptr(model))
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def roq_model_dot_model(weights, model):
+    """ROQ model dot model product for a model evaluated at the interpolation nodes"""
+
+    weights = _as_double(weights, 2)
+    model = _as_double(model, 1)
+    if weights.shape != (len(model), len(model)):
+        raise ValueError("Model and weights have inconsistent sizes")
+    return load_library().roq_model_dot_model_array(_ptr(weights), len(model), _ptr(model))
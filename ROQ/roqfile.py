@@ -0,0 +1,188 @@
+"""
+A binary file format for storing a reduced order quadrature.
+
+The file consists of:
+
+  * the 8 byte magic string ROQFILE1
+  * the length of the header as a little-endian 8 byte unsigned integer
+  * a JSON header giving the data type, shape, byte offset and SHA-256
+    checksum of each stored array, plus any user metadata
+  * the raw (C-ordered) array data, with each array aligned to 64 bytes
+
+The arrays are stored uncompressed so that, on loading, they can be memory
+mapped directly from the file and are only read from disk when accessed. This
+replaces saving the B matrix and interpolation nodes as text files, e.g.
+
+>>> save_roq("roq.bin", basis=RB_matrix, nodes=indices, B=B, grid=fseries, weights=df)
+>>> roq = load_roq("roq.bin")
+>>> weights = np.inner(roq.B, data.conjugate()*roq.weights)
+"""
+
+import hashlib
+import json
+import struct
+
+import numpy as np
+
+
+MAGIC = b"ROQFILE1"
+ALIGNMENT = 64
+
+# the arrays that make up a reduced order quadrature
+ROQ_ARRAYS = ['basis', 'nodes', 'B', 'grid', 'weights']
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def _padding(position):
+    """Number of bytes required to pad position to the next alignment boundary"""
+    return (-position) % ALIGNMENT
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def _checksum(array):
+    """SHA-256 checksum of the raw bytes of an array"""
+    sha = hashlib.sha256()
+    flat = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+    for start in range(0, len(flat), 1 << 24):
+        sha.update(flat[start:start+(1 << 24)])
+    return sha.hexdigest()
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def save_roq(filename, basis=None, nodes=None, B=None, grid=None, weights=None, metadata=None, **arrays):
+    """
+    Save a reduced order quadrature to a binary file.
+
+    Args:
+        filename (str): the output file name
+        basis (array): the reduced basis (nbases x length)
+        nodes (array): the empirical interpolation node indices
+        B (array): the empirical interpolant B matrix (nbases x length)
+        grid (array): the time/frequency series on which the basis is defined
+        weights (float or array): the integration weights (e.g. dt or df)
+        metadata (dict): any JSON serialisable metadata to store in the header
+
+    Any additional keyword arguments are stored as extra named arrays.
+    """
+
+    named = dict(zip(ROQ_ARRAYS, [basis, nodes, B, grid, weights]))
+    named.update(arrays)
+
+    header = {'version': 1, 'arrays': {}, 'metadata': {} if metadata is None else metadata}
+
+    data = []
+    offset = 0
+    for name in sorted(named):
+        if named[name] is None:
+            continue
+
+        array = np.asarray(named[name])
+        if array.ndim > 0:
+            array = np.ascontiguousarray(array)
+        if name == 'nodes':
+            array = array.astype(np.int64)
+        if array.dtype.hasobject:
+            raise TypeError("Array '%s' cannot be stored as it has an object data type" % name)
+
+        # store in little-endian byte order
+        array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+
+        header['arrays'][name] = {'dtype': array.dtype.str,
+                                  'shape': list(array.shape),
+                                  'offset': offset,
+                                  'sha256': _checksum(array)}
+        data.append(array)
+        offset += array.nbytes + _padding(array.nbytes)
+
+    hbytes = json.dumps(header, sort_keys=True).encode('utf-8')
+    hbytes += b" "*_padding(len(MAGIC)+8+len(hbytes))
+
+    with open(filename, 'wb') as fp:
+        fp.write(MAGIC)
+        fp.write(struct.pack('<Q', len(hbytes)))
+        fp.write(hbytes)
+        for array in data:
+            fp.write(array.tobytes())
+            fp.write(b"\0"*_padding(array.nbytes))
+
+
+class ROQFile(object):
+    """
+    A reduced order quadrature read from a file created with :func:`save_roq`.
+
+    Only the header is read on creation. Each array (available as an attribute,
+    e.g. roq.B, or item, e.g. roq['B']) is memory mapped from the file the first
+    time it is accessed. Arrays that were not stored are returned as None.
+
+    Args:
+        filename (str): the file to read
+        verify (bool): check the checksums of all the arrays on loading (this
+            requires reading the whole file)
+    """
+
+    def __init__(self, filename, verify=False):
+        self.filename = filename
+
+        with open(filename, 'rb') as fp:
+            magic = fp.read(len(MAGIC))
+            if magic != MAGIC:
+                raise IOError("'%s' is not an ROQ file" % filename)
+
+            hlength, = struct.unpack('<Q', fp.read(8))
+            self.header = json.loads(fp.read(hlength).decode('utf-8'))
+
+        self._dataoffset = len(MAGIC) + 8 + hlength
+        self._arrays = {}
+
+        if verify:
+            self.verify()
+
+    @property
+    def metadata(self):
+        return self.header['metadata']
+
+    def keys(self):
+        return list(self.header['arrays'].keys())
+
+    def __contains__(self, name):
+        return name in self.header['arrays']
+
+    def __getitem__(self, name):
+        if name not in self._arrays:
+            try:
+                info = self.header['arrays'][name]
+            except KeyError:
+                raise KeyError("No array '%s' in '%s'" % (name, self.filename))
+
+            shape = tuple(info['shape'])
+            offset = self._dataoffset + info['offset']
+            if int(np.prod(shape)) == 0:
+                array = np.empty(shape, dtype=info['dtype'])
+            elif len(shape) == 0:
+                array = np.memmap(self.filename, dtype=info['dtype'], mode='r', offset=offset, shape=(1,))[0]
+            else:
+                array = np.memmap(self.filename, dtype=info['dtype'], mode='r', offset=offset, shape=shape)
+            self._arrays[name] = array
+
+        return self._arrays[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name in ('header', 'filename') or name not in ROQ_ARRAYS + self.keys():
+            raise AttributeError(name)
+        return self[name] if name in self else None
+
+    def verify(self, names=None):
+        """
+        Check the checksums of the given arrays (or all arrays if names is
+        None), raising an IOError if any of them do not match.
+        """
+
+        for name in (self.keys() if names is None else names):
+            if _checksum(self[name]) != self.header['arrays'][name]['sha256']:
+                raise IOError("Checksum mismatch for array '%s' in '%s'" % (name, self.filename))
+
+
+#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def load_roq(filename, verify=False):
+    """Lazily load a reduced order quadrature saved with :func:`save_roq`"""
+    return ROQFile(filename, verify=verify)
@@ -2,6 +2,7 @@
 
 import numpy as np
 from misc import *
+from greedy import projection_errors, GreedyReducedBasis
 import matplotlib.pyplot as plt
 
 from lalapps import pulsarpputils as pppu
@@ -42,54 +43,15 @@ for i in range(TS_size):
   # normalize
   TS[i] /= np.sqrt(abs(dot_product(dt, TS[i], TS[i])))
   
-# Allocate storage for projection coefficients of training space waveforms onto the reduced basis elements
-proj_coefficients = np.zeros(TS_size*TS_size).reshape(TS_size, TS_size)
-
-# Allocate matrix to store the projection of training space waveforms onto the reduced basis 
-projections = np.zeros(TS_size*len(ts)).reshape(TS_size, len(ts)) 
-
-rb_errors = []
-
 #### Begin greedy: see Field et al. arXiv:1308.3565v2 #### 
 
 tolerance = 10e-12 # set maximum RB projection error
 
-sigma = 1 # (2) of Algorithm 1. (projection error at 0th iteration)
-
-rb_errors.append(sigma)
-
-RB_matrix = [TS[0]] # (3) of Algorithm 1. (seed greedy algorithm (arbitrary))
-
-iter = 0
-
-#print TS
-
-while sigma >= tolerance: # (5) of Algorithm 1.
-  # project the whole training set onto the reduced basis set
-  projections = project_onto_basis(dt, RB_matrix, TS, projections, proj_coefficients, iter) 
-
-  residual = TS - projections
-  # Find projection errors
-  projection_errors = [dot_product(dt, residual[i], residual[i]) for i in range(len(residual))]
-  
-  print projection_errors
-  
-  sigma = abs(max(projection_errors)) # (7) of Algorithm 1. (Find largest projection error)
-  print sigma, iter
-  index = np.argmax(projection_errors) # Find Training-space index of waveform with largest proj. error 
-
-  rb_errors.append(sigma)
-    
-  #Gram-Schmidt to get the next basis and normalize
-
-  print index
-  
-  next_basis = TS[index] - projections[index] # (9) of Algorithm 1. (Gram-Schmidt)
-  next_basis /= np.sqrt(abs(dot_product(dt, next_basis, next_basis))) #(10) of Alg 1. (normalize)
+greedy = GreedyReducedBasis(dt, tolerance=tolerance, verbose=True)
+RB_matrix = greedy.build(TS) # seeded with TS[0]
+rb_errors = greedy.errors
 
-  RB_matrix.append(next_basis) # (11) of Algorithm 1. (append reduced basis set)
-
-  iter += 1
+print("%d bases created in %f s" % (len(RB_matrix), np.sum(greedy.iteration_times)))
   
 #print TS
   
@@ -109,23 +71,7 @@ for i in range(TS_rand_size):
 
 
 ### find projection errors ###
-iter = 0
-proj_rand = np.zeros(len(ts))
-proj_error = []
-
-for h in TS_rand:
-  while iter < len(RB_matrix):
-    proj_coefficients_rand = dot_product(dt, RB_matrix[iter], h)
-    proj_rand += proj_coefficients_rand*RB_matrix[iter]
-
-    iter += 1
-
-  residual = h - proj_rand
-  projection_errors = abs(dot_product(dt, residual, residual))
-  proj_error.append(projection_errors)
-  proj_rand = np.zeros(len(ts))
-        
-  iter = 0
+proj_error = projection_errors(dt, RB_matrix, TS_rand)
         
 plt.scatter(np.linspace(0, len(proj_error), len(proj_error)), np.log10(proj_error))
 plt.ylabel('log10 projection error')
@@ -0,0 +1,153 @@
+"""
+Lazily generated training sets for reduced basis construction.
+
+A training set of 10^5-10^6 waveforms will not generally fit in memory, so
+rather than allocating a TS_size x length array up front the waveforms are
+produced in chunks from a signal model function whenever they are needed. The
+chunks can optionally be written (once) to a memory-mapped float64 file, so
+that later passes over the training set just read them back from disk.
+"""
+
+import numpy as np
+
+
+class TrainingSet(object):
+    """
+    A training set of waveforms generated in chunks from a signal model.
+
+    Args:
+        model (callable): the signal model function, e.g. the signalmodel
+            functions in the toymodel scripts
+        params (dict): a dictionary of arrays (all of the same length) of the
+            model keyword arguments that vary between training waveforms
+        fixed (dict): a dictionary of model keyword arguments that are the
+            same for all training waveforms (e.g. the time stamps)
+        weights (float or array): the integration weights used to normalise
+            each waveform
+        chunksize (int): the number of waveforms to generate at once
+        filename (str): if given the training set is generated once and
+            stored in a memory-mapped float64 file with this name
+        normalise (bool): normalise each waveform to have unit weighted norm
+        vectorised (bool): if True the model will be called once per chunk
+            with each varying parameter as an (n x 1) column array and must
+            return an (n x length) array of waveforms, otherwise the model is
+            called once per waveform
+
+    For example, for the model in toymodel.py:
+
+    >>> TS = TrainingSet(signalmodel, {'f0': f0s, 'f1': f1s}, fixed={'A': 1., 't': ts}, weights=dt)
+    >>> RB_matrix = GreedyReducedBasis(dt).build(TS)
+    """
+
+    def __init__(self, model, params, fixed=None, weights=1., chunksize=1000,
+                 filename=None, normalise=True, vectorised=False):
+        self.model = model
+        self.params = dict((key, np.asarray(value)) for key, value in params.items())
+        self.fixed = {} if fixed is None else dict(fixed)
+        self.weights = weights
+        self.chunksize = int(chunksize)
+        self.normalise = normalise
+        self.vectorised = vectorised
+        self.filename = filename
+
+        sizes = set(len(value) for value in self.params.values())
+        if len(sizes) != 1:
+            raise ValueError("All varying parameters must have the same number of values")
+        self._size = sizes.pop()
+
+        # generate a single waveform to get the length and data type
+        first = self.generate(0, 1)
+        self._length = first.shape[1]
+        self._dtype = first.dtype
+
+        self._mmap = None
+        if filename is not None:
+            if self._dtype != np.float64:
+                raise TypeError("Only float64 training sets can be stored in a memory-mapped file")
+            self._mmap = np.memmap(filename, dtype=np.float64, mode='w+', shape=self.shape)
+            for start in range(0, self._size, self.chunksize):
+                stop = min(start+self.chunksize, self._size)
+                self._mmap[start:stop] = self.generate(start, stop)
+            self._mmap.flush()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def shape(self):
+        return (self._size, self._length)
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    def generate(self, start, stop):
+        """
+        Generate the (stop-start) x length array of training waveforms
+        start to stop.
+        """
+
+        if self.vectorised:
+            kwargs = dict((key, value[start:stop, np.newaxis]) for key, value in self.params.items())
+            kwargs.update(self.fixed)
+            chunk = np.atleast_2d(self.model(**kwargs))
+        else:
+            chunk = None
+            for i in range(start, stop):
+                kwargs = dict((key, value[i]) for key, value in self.params.items())
+                kwargs.update(self.fixed)
+                h = self.model(**kwargs)
+                if chunk is None:
+                    chunk = np.empty((stop-start, len(h)), dtype=np.result_type(h, np.float64))
+                chunk[i-start] = h
+
+        if self.normalise:
+            norms = np.real(np.einsum('ij,ij->i', chunk.conj()*self.weights, chunk))
+            chunk /= np.sqrt(np.abs(norms))[:, np.newaxis]
+
+        return chunk
+
+    def iterchunks(self):
+        """
+        Iterate over the training set yielding the index of the first waveform
+        in each chunk and the chunk of waveforms.
+        """
+
+        for start in range(0, self._size, self.chunksize):
+            stop = min(start+self.chunksize, self._size)
+            if self._mmap is not None:
+                yield start, self._mmap[start:stop]
+            else:
+                yield start, self.generate(start, stop)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._size)
+            if step != 1:
+                raise IndexError("TrainingSet slices must be contiguous")
+            if self._mmap is not None:
+                return self._mmap[start:stop]
+            return self.generate(start, stop)
+
+        if not isinstance(index, (int, np.integer)):
+            raise TypeError("TrainingSet indices must be integers or slices")
+
+        if index < 0:
+            index += self._size
+        if index < 0 or index >= self._size:
+            raise IndexError("Training set index out of range")
+
+        if self._mmap is not None:
+            return np.array(self._mmap[index])
+        return self.generate(index, index+1)[0]
+
+    def __getstate__(self):
+        # don't pickle the contents of the memory-mapped file, just reopen it
+        state = self.__dict__.copy()
+        state['_mmap'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.filename is not None:
+            self._mmap = np.memmap(self.filename, dtype=np.float64, mode='r', shape=self.shape)
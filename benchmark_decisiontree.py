@@ -0,0 +1,67 @@
+"""
+Benchmark the fit and predict times (and test set accuracy) of the random
+forest in decisiontree.py, for different numbers of processes, against
+those of a single decision tree, using a simulated classification data set.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from decisiontree import DecisionTree, RandomForest
+
+
+def simulate(npoints, nfeatures, rng):
+    """
+    Simulate a three class data set with a non-linear boundary and noise.
+    """
+
+    X = rng.normal(size=(npoints, nfeatures))
+    score = X[:, 0] + X[:, 1] ** 2 + 0.5 * rng.normal(size=npoints)
+    y = np.where(score > 1, 0, np.where(X[:, 2] > 0, 1, 2))
+
+    return X, y
+
+
+def timeit(func, *args):
+    t0 = time.time()
+    result = func(*args)
+    return result, time.time() - t0
+
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--npoints", type=int, default=20000, help="number of training points [%(default)s]")
+parser.add_argument("--nfeatures", type=int, default=8, help="number of features [%(default)s]")
+parser.add_argument("--ntrees", type=int, default=32, help="number of trees in the forest [%(default)s]")
+parser.add_argument("--nprocs", type=int, nargs="+", default=[1, 2, 4], help="numbers of processes [%(default)s]")
+parser.add_argument("--min-leaf-points", type=int, default=5, help="minimum number of points in a leaf [%(default)s]")
+parser.add_argument("--seed", type=int, default=1, help="random seed [%(default)s]")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    X, y = simulate(args.npoints, args.nfeatures, rng)
+    Xtest, ytest = simulate(args.npoints, args.nfeatures, rng)
+
+    print(f"{'model':<14} {'nprocs':>6} {'fit (s)':>10} {'predict (s)':>12} {'test error':>11} {'OOB error':>10}")
+
+    tree = DecisionTree(min_leaf_points=args.min_leaf_points)
+    _, tfit = timeit(tree.fit, X, y)
+    pred, tpred = timeit(tree.predict, Xtest)
+    print(f"{'tree':<14} {1:>6} {tfit:>10.3f} {tpred:>12.4f} {np.mean(pred != ytest):>11.4f} {'-':>10}")
+
+    for nprocs in args.nprocs:
+        forest = RandomForest(
+            n_trees=args.ntrees,
+            min_leaf_points=args.min_leaf_points,
+            nprocs=nprocs,
+            random_state=args.seed,
+        )
+        _, tfit = timeit(forest.fit, X, y)
+        pred, tpred = timeit(forest.predict, Xtest)
+        print(
+            f"{'forest (' + str(args.ntrees) + ')':<14} {nprocs:>6} {tfit:>10.3f} {tpred:>12.4f} "
+            f"{np.mean(pred != ytest):>11.4f} {forest.oob_error:>10.4f}"
+        )
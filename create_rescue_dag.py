@@ -1,69 +1,477 @@
-jobs = []
-
-# get job names from DAG file
-dagfile = "mydag.dag"  # examples dag name
-with open(dagfile, "r") as fp:
-    for line in fp.readlines():
-        if "JOB" == line[0:3]:
-            jobs.append(line.split()[1])
-
-# get log data (split on ellipsis)
-with open("{}.nodes.log".format(dagfile), "r") as fp:
-    logdata = fp.read().split("...")
-
-# get cluster ids associated with each job
-nodeid = {}
-for log in logdata:
-    # cluster
-    l = log.split()
-
-    if len(l) < 1:
-        continue
-
-    cluster = l[1].strip("(").strip(")")  # cluster id    
-
-    if "DAG Node" in log:
-        nodeid[cluster] = {}
-        dagjobid = l[-1]
-        nodeid[cluster]["job"] = dagjobid
-
-
-# get jobs that exited with "Normal termination (return value 0)"
-success = []
-for log in logdata:
-    l = log.split()
-
-    if len(l) < 1:
-        continue
-
-    cluster = l[1].strip("(").strip(")")  # cluster id
-    if "Normal termination (return value 0)" in log:
-        success.append(cluster)
-
-
-# get list of DONE jobs and list of not done jobs
-success = set(success)  # convert to set for quicker searching
-done = []
-todo = []
-for job in jobs:
-    isdone = False
-    for cluster in nodeid:
-        if nodeid[cluster]["job"] == job:
-            if cluster in success:
-                done.append(job)
-                isdone = True
+"""
+Create rescue DAG files (marking all successfully completed nodes as DONE)
+from DAG files and their DAGMan nodes logs, e.g.
+
+  python create_rescue_dag.py mydag.dag otherdag.dag --nprocs 4
+
+The nodes log is streamed one event at a time (events are separated by "..."
+lines), so memory use scales with the number of nodes in the DAG rather than
+the size of the log. If a node has been resubmitted (e.g. through RETRY) only
+the latest cluster associated with it counts.
+
+The parsing state (the byte offset reached in the log, the job to cluster map
+and the set of successful clusters) is checkpointed to a small JSON sidecar
+file ("mydag.dag.rescue_state.json"), so that running this again while the DAG
+is still going only parses the events appended to the log since the last run.
+
+Nodes from SPLICE DAGs are included in their parent DAG (named
+"splice+node"), while SUBDAG EXTERNAL DAGs get their own rescue files created
+from their own nodes logs. The nodes logs of the DAGs are parsed in parallel.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+# DAG file keywords defining nodes
+NODE_KEYWORDS = ["JOB", "FINAL"]
+
+
+def _dag_path(parentdir, filename, directory=None):
+    """
+    Get the path of a file given relative to a DAG (in directory parentdir),
+    or relative to a node's DIR.
+    """
+
+    if directory is not None:
+        filename = os.path.join(directory, filename)
+    return os.path.normpath(os.path.join(parentdir, filename))
+
+
+def _directory(words):
+    # get the value of a DIR option
+    upper = [word.upper() for word in words]
+    return words[upper.index("DIR") + 1] if "DIR" in upper[:-1] else None
+
+
+def read_dag(dagfile, prefix="", directory=None):
+    """
+    Get the node names from a DAG file (including those in any SPLICE DAGs
+    and INCLUDE files, with spliced node names prefixed by the splice name and
+    "+") and the paths to any SUBDAG EXTERNAL DAG files. DAG keywords are case
+    insensitive.
+    """
+
+    jobs = []
+    subdags = []
+
+    if directory is None:
+        directory = os.path.dirname(dagfile)
+
+    with open(dagfile, "r") as fp:
+        for line in fp:
+            words = line.split()
+
+            if len(words) < 2 or words[0].startswith("#"):
+                continue
+
+            keyword = words[0].upper()
+
+            if keyword in NODE_KEYWORDS:
+                jobs.append(prefix + words[1])
+            elif keyword == "SUBDAG" and len(words) > 3 and words[1].upper() == "EXTERNAL":
+                jobs.append(prefix + words[2])
+                subdags.append(_dag_path(directory, words[3], _directory(words[4:])))
+            elif keyword == "SPLICE" and len(words) > 2:
+                splicedir = _dag_path(directory, _directory(words[3:]) or "")
+                splicejobs, splicesubdags = read_dag(
+                    _dag_path(splicedir, words[2]),
+                    prefix="{}{}+".format(prefix, words[1]),
+                    directory=splicedir,
+                )
+                jobs.extend(splicejobs)
+                subdags.extend(splicesubdags)
+            elif keyword == "INCLUDE":
+                includejobs, includesubdags = read_dag(
+                    _dag_path(directory, words[1]), prefix=prefix, directory=directory
+                )
+                jobs.extend(includejobs)
+                subdags.extend(includesubdags)
+
+    return jobs, subdags
+
+
+def collect_dags(dagfiles, subdags=True):
+    """
+    Get a list of DAG files including all their (nested) SUBDAG EXTERNAL DAGs
+    (unless subdags is False). Each DAG is only included once, however its
+    path is given (e.g. "mydag.dag" and "./mydag.dag").
+    """
+
+    dags = []
+    paths = set()
+    queue = list(dagfiles)
+    while len(queue) > 0:
+        dagfile = queue.pop(0)
+        path = os.path.realpath(dagfile)
+        if path in paths:
+            continue
+
+        dags.append(dagfile)
+        paths.add(path)
+        if subdags:
+            queue.extend(read_dag(dagfile)[1])
+
+    return dags
+
+
+def rescue_file(dagfile, overwrite=False):
+    """
+    Get the name of the next rescue DAG file (e.g. "mydag.dag.rescue002" if
+    "mydag.dag.rescue001" already exists), or of the latest existing rescue
+    file if overwrite is True.
+    """
+
+    numbers = [0]
+    for filename in glob.glob(glob.escape(dagfile) + ".rescue[0-9][0-9][0-9]"):
+        numbers.append(int(filename[-3:]))
+
+    number = max(numbers)
+    if not overwrite or number == 0:
+        number += 1
+
+    return "{}.rescue{:03d}".format(dagfile, number)
+
+
+def iter_events(fp, blocksize=2 ** 22):
+    """
+    Iterate over the complete events in a binary nodes log file object, read
+    in blocks of blocksize bytes. For each block this yields a list of the
+    (decoded) text of each complete event and the number of bytes read up to
+    the end of the last of those events. Any incomplete event at the end of
+    the file (e.g. if it is still being written) is not returned.
+    """
+
+    buffer = b""
+    nbytes = 0
+    while True:
+        block = fp.read(blocksize)
+        if not block:
             break
 
-    if not isdone:
-        todo.append(job)
+        buffer += block
+
+        # events are separated by "..." lines
+        idx = buffer.rfind(b"\n...")
+        if idx < 0:
+            continue
+
+        events = buffer[:idx].decode("utf-8", "replace").split("\n...")
+        nbytes += idx + 4
+        buffer = buffer[idx + 4 :]
+
+        yield events, nbytes
+
+
+def file_head(logfile, size=1024):
+    """
+    Get a hash of the start of a file, used to check if a log file has been
+    replaced since it was last read.
+    """
+
+    with open(logfile, "rb") as fp:
+        return hashlib.sha1(fp.read(size)).hexdigest()
+
+
+class NodeStatus:
+    """
+    The status of the nodes in a DAG from its nodes log. ``latest`` maps each
+    job to the latest cluster id submitted for it, ``owner`` maps those
+    clusters back to their job, ``success`` is the set of those clusters
+    that terminated normally and ``terminated`` is the set of those clusters
+    that have terminated (or been aborted). ``offset`` is the byte offset in
+    the log up to which events have been parsed.
+    """
+
+    def __init__(self):
+        self.latest = {}
+        self.owner = {}
+        self.success = set()
+        self.terminated = set()
+        self.offset = 0
+        self.head = None
+        self.rescue = None  # the last rescue file written and the offset it was written at
+
+    def update_event(self, event):
+        """
+        Update the status with a single event (the text of the event).
+        """
+
+        l = event.split(None, 2)
+        if len(l) < 2:
+            return
+
+        cluster = l[1].strip("()")  # cluster id
+
+        idx = event.find("DAG Node")
+        if idx >= 0:
+            job = event[idx:].split(None, 3)[2]
+
+            # forget any previous cluster for this job
+            previous = self.latest.get(job, None)
+            if previous is not None and previous != cluster:
+                self.owner.pop(previous, None)
+                self.success.discard(previous)
+                self.terminated.discard(previous)
+
+            self.latest[job] = cluster
+            self.owner[cluster] = job
+
+        if cluster in self.owner:
+            if l[0] in ["005", "009"]:
+                # job terminated or aborted
+                self.terminated.add(cluster)
+
+            if "Normal termination (return value 0)" in event:
+                self.success.add(cluster)
+
+    def update(self, fp):
+        """
+        Update the status from the complete events in a binary nodes log file
+        object, starting from the current position in the file, and advance
+        the offset to the end of the last complete event.
+        """
+
+        start = self.offset
+        for events, nbytes in iter_events(fp):
+            for event in events:
+                self.update_event(event)
+            self.offset = start + nbytes
+
+    def update_from_log(self, logfile):
+        """
+        Update the status with any new events in a nodes log file. If the log
+        has been truncated or replaced since it was last read then it is
+        re-parsed from the start.
+        """
+
+        if os.path.getsize(logfile) < self.offset or (
+            self.head is not None and file_head(logfile, self.headsize) != self.head
+        ):
+            self.__init__()
+
+        with open(logfile, "rb") as fp:
+            fp.seek(self.offset)
+            self.update(fp)
+
+        self.head = file_head(logfile, self.headsize)
+
+    @property
+    def headsize(self):
+        # the number of bytes at the start of the log used to check it is unchanged
+        return min(self.offset, 1024)
+
+    def is_done(self, job):
+        return self.latest.get(job, None) in self.success
+
+    def summary(self, jobs):
+        """
+        Get a dictionary of the number of DAG jobs that are done, have failed,
+        are queued/running, or have not been submitted.
+        """
+
+        done = sum(1 for job in jobs if self.is_done(job))
+        finished = sum(1 for job in jobs if self.latest.get(job, None) in self.terminated)
+        submitted = sum(1 for job in jobs if job in self.latest)
+
+        return {
+            "total": len(jobs),
+            "done": done,
+            "failed": finished - done,
+            "running": submitted - finished,
+            "unsubmitted": len(jobs) - submitted,
+        }
+
+    def to_dict(self):
+        return {
+            "offset": self.offset,
+            "head": self.head,
+            "latest": self.latest,
+            "success": sorted(self.success),
+            "terminated": sorted(self.terminated),
+            "rescue": self.rescue,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        status = cls()
+        status.offset = state["offset"]
+        status.head = state["head"]
+        status.latest = state["latest"]
+        status.owner = {cluster: job for job, cluster in status.latest.items()}
+        status.success = set(state["success"])
+        status.terminated = set(state["terminated"])
+        status.rescue = state.get("rescue", None)
+        return status
+
+    def save(self, statefile):
+        """
+        Save the status to a JSON state file (written to a temporary file
+        first, so an interrupted write does not corrupt an existing state).
+        """
+
+        tmpfile = statefile + ".tmp"
+        with open(tmpfile, "w") as fp:
+            json.dump(self.to_dict(), fp)
+        os.replace(tmpfile, statefile)
+
+    @classmethod
+    def load(cls, statefile):
+        """
+        Load the status from a JSON state file, returning a new status if the
+        file does not exist or cannot be read.
+        """
+
+        try:
+            with open(statefile, "r") as fp:
+                return cls.from_dict(json.load(fp))
+        except (OSError, ValueError, KeyError):
+            return cls()
+
+
+def parse_nodes_log(logfile):
+    """
+    Get the NodeStatus from a DAG nodes log file.
+    """
+
+    status = NodeStatus()
+    status.update_from_log(logfile)
+
+    return status
+
+
+def write_rescue(rescuefile, jobs, status):
+    """
+    Write out a rescue DAG file given the DAG's jobs and their status,
+    returning the list of DONE jobs.
+    """
+
+    done = [job for job in jobs if status.is_done(job)]
+    summary = status.summary(jobs)
+
+    with open(rescuefile, "w") as fp:
+        fp.write("# Total number of Nodes: {}\n".format(len(jobs)))
+        fp.write("# Nodes premarked DONE: {}\n".format(len(done)))
+        fp.write("# Nodes that failed: {}\n\n".format(summary["failed"]))
+
+        for donejob in done:
+            fp.write("DONE {}\n".format(donejob))
+
+    return done
+
+
+def create_rescue_dag(dagfile, statefile=None, overwrite=False):
+    """
+    Create the rescue DAG file for a DAG file, returning a dictionary with the
+    rescue file name, the status summary, the number of bytes of the nodes
+    log that were parsed and the time taken. The parsing state is loaded from,
+    and saved to, statefile (which defaults to the DAG file name with
+    ".rescue_state.json" appended).
+    """
+
+    start = time.time()
+
+    if statefile is None:
+        statefile = "{}.rescue_state.json".format(dagfile)
+
+    jobs = read_dag(dagfile)[0]
+
+    status = NodeStatus.load(statefile)
+    offset = status.offset
+
+    logfile = "{}.nodes.log".format(dagfile)
+    if os.path.isfile(logfile):
+        status.update_from_log(logfile)
+
+    rescuefile = rescue_file(dagfile, overwrite=overwrite)
+
+    # if the log has not moved on since the latest rescue file was written
+    # (by a previous run) rewrite that file rather than creating a new one
+    latest = rescue_file(dagfile, overwrite=True)
+    if status.rescue is not None and status.rescue == {"file": latest, "offset": status.offset}:
+        rescuefile = latest
+
+    write_rescue(rescuefile, jobs, status)
+
+    status.rescue = {"file": rescuefile, "offset": status.offset}
+    status.save(statefile)
+
+    return {
+        "dagfile": dagfile,
+        "rescuefile": rescuefile,
+        "summary": status.summary(jobs),
+        # (the log is re-parsed from the start if it has been replaced)
+        "nbytes": status.offset - offset if status.offset >= offset else status.offset,
+        "time": time.time() - start,
+    }
+
+
+SUMMARY_FORMAT = (
+    "{total} nodes: {done} done, {failed} failed, {running} queued/running, "
+    "{unsubmitted} not submitted"
+)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "dagfiles", nargs="*", default=["mydag.dag"], help="DAG files [%(default)s]"
+    )
+    parser.add_argument(
+        "--nprocs", type=int, default=None, help="number of parallel processes"
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        default=False,
+        help="overwrite the latest existing rescue file rather than creating the next one",
+    )
+    parser.add_argument(
+        "--no-subdags",
+        action="store_true",
+        default=False,
+        help="do not create rescue files for SUBDAG EXTERNAL DAGs",
+    )
+
+    args = parser.parse_args(args)
+
+    start = time.time()
+
+    dagfiles = collect_dags(args.dagfiles, subdags=not args.no_subdags)
+
+    totals = dict.fromkeys(["total", "done", "failed", "running", "unsubmitted"], 0)
+    nbytes = 0
+
+    with ProcessPoolExecutor(max_workers=args.nprocs) as executor:
+        results = executor.map(
+            create_rescue_dag, dagfiles, [None] * len(dagfiles), [args.overwrite] * len(dagfiles)
+        )
+
+        for result in results:
+            print("{}: {}".format(result["rescuefile"], SUMMARY_FORMAT.format(**result["summary"])))
+
+            for key in totals:
+                totals[key] += result["summary"][key]
+            nbytes += result["nbytes"]
+
+    elapsed = time.time() - start
+
+    print("Total ({} DAGs): {}".format(len(dagfiles), SUMMARY_FORMAT.format(**totals)))
+    print(
+        "Parsed {:.1f} MB of nodes logs in {:.2f} s ({:.1f} MB/s)".format(
+            nbytes / 1e6, elapsed, nbytes / 1e6 / elapsed
+        )
+    )
 
-# create rescue dag
-rescuefile = "{}.rescue001".format(dagfile)
+    return totals
 
-with open(rescuefile, "w") as fp:
-    fp.write("# Total number of Nodes: {}\n".format(len(jobs)))
-    fp.write("# Nodes premarked DONE: {}\n".format(len(done)))
-    fp.write("# Nodes that failed: {}\n\n".format(len(nodeid) - len(done)))
 
-    for donejob in done:
-        fp.write("DONE {}\n".format(donejob))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,770 @@
+"""
+A simple decision tree classifier (from DecisionTree.ipynb), using the
+information gain (entropy) criterion.
+
+The information gain for every possible split of a feature is found in a
+single pass over the feature values, once sorted, using the cumulative
+numbers of each class, so finding a split is O(N log N) rather than O(N^2).
+
+:class:`DecisionTree` stores a tree as a set of parallel arrays (the split
+feature and threshold, the children, class counts and depth of each node),
+built by working through a queue of nodes that each hold an array of indices
+into a single shared feature matrix, and can classify many points at once:
+
+>>> tree = DecisionTree(min_leaf_points=5).fit(X, y)
+>>> predictions = tree.predict(Xtest)
+
+:class:`RandomForest` is a bagged ensemble of (random feature subset) trees,
+which can be trained in parallel, e.g.
+
+>>> forest = RandomForest(n_trees=100, nprocs=4).fit(X, y)
+>>> predictions = forest.predict(Xtest)
+>>> forest.oob_error
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def entropy(counts, N=None):
+    """
+    Calculate the entropy for a set of numbers of items in each category.
+
+    Parameters
+    ----------
+    counts: array_like
+        The numbers of items in each category. This can be a 2D array with
+        one set of numbers per row.
+    N: array_like
+        The total number of items (in each row). If not given this is the
+        sum of the counts.
+
+    Returns
+    -------
+    Z: float or array_like
+        The entropy (of each row).
+    """
+
+    counts = np.asarray(counts, dtype=float)
+    N = counts.sum(axis=-1) if N is None else np.asarray(N, dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = counts / np.expand_dims(N, -1)
+        plogp = np.where(p > 0, p * np.log2(np.where(p > 0, p, 1.0)), 0.0)
+
+    return -np.sum(plogp, axis=-1)
+
+
+def split_gains(x, y, pentropy=None):
+    """
+    Calculate the information gain when splitting a set of points at each
+    value of a given parameter, i.e., into points with x <= value and
+    x > value.
+
+    Parameters
+    ----------
+    x: array_like
+        The parameter values for each point.
+    y: array_like
+        The categories/labels (as integers from 0 to the number of
+        categories minus 1) for each point.
+    pentropy: float
+        The entropy of the full set of points (calculated if not given).
+
+    Returns
+    -------
+    values: array_like
+        The sorted unique parameter values.
+    gains: array_like
+        The information gain for splitting at each unique value.
+    runs: array_like
+        The index into values for each point.
+    """
+
+    x = np.asarray(x)
+    y = np.asarray(y)
+    N = len(x)
+
+    # sort the parameter values
+    order = np.argsort(x, kind="stable")
+    xs = x[order]
+
+    # cumulative numbers of each category below each sorted point
+    counts = np.zeros((N, y.max() + 1))
+    counts[np.arange(N), y[order]] = 1.0
+    np.cumsum(counts, axis=0, out=counts)
+
+    if pentropy is None:
+        pentropy = entropy(counts[-1])
+
+    # splits are at the last of each set of equal values
+    newvalue = xs[1:] != xs[:-1]
+    last = np.flatnonzero(np.append(newvalue, True))
+
+    below = counts[last]
+    above = counts[-1] - below
+    nbelow = last + 1.0
+    nabove = N - nbelow
+
+    # weighted entropy for each side of the split
+    weightedZ = (nbelow / N) * entropy(below, nbelow) + (nabove / N) * entropy(above, nabove)
+
+    runs = np.empty(N, dtype=int)
+    runs[order] = np.concatenate(([0], np.cumsum(newvalue)))
+
+    return xs[last], pentropy - weightedZ, runs
+
+
+class Node:
+    """
+    A node in a decision tree.
+
+    Parameters
+    ----------
+    X: array_like
+        A 2D array of parameter values, with a column for each parameter
+        (or a pandas DataFrame, which can include the column of y).
+    y: array_like
+        The array of categories/labels.
+    parent: Node
+        The parent node.
+    colnames: list
+        The names of the parameters (if X is not a DataFrame).
+    """
+
+    def __init__(self, X, y, parent=None, colnames=None):
+        # set y-values
+        self.y = np.asarray(y)
+
+        if hasattr(X, "columns"):
+            # set other parameter names
+            self.colnames = [col for col in X.columns if col != getattr(y, "name", None)]
+            X = X[self.colnames].to_numpy()
+        else:
+            self.colnames = list(range(X.shape[1])) if colnames is None else list(colnames)
+
+        # set X values
+        self.X = np.asarray(X)
+
+        # get unique categories/labels in y, and their numbers
+        self.categories, self.yidx, self.numbers = np.unique(
+            self.y, return_inverse=True, return_counts=True
+        )
+
+        # initialise is_leaf to False or True if only one category
+        self.is_leaf = False if len(self.categories) > 1 else True
+
+        # set parent
+        self.parent = parent
+
+        # depth of the node, i.e., how many parents
+        self.depth = 0 if parent is None else parent.depth + 1
+
+        # empty list of children
+        self.children = []
+
+        # calculate entropy
+        self.entropy = entropy(self.numbers)
+
+        # return if already a leaf node
+        if self.is_leaf:
+            return
+
+        # calculate the max information gain across each parameter
+        self.H = {}
+        Hmax = -np.inf
+        for i, col in enumerate(self.colnames):
+            H = self.information_gain(col, self.entropy)
+            imax = np.argmax(H)
+            self.H[col] = {
+                "splitvalue": self.X[imax, i],
+                "Hmax": H[imax],
+            }
+
+            if H[imax] > Hmax:
+                Hmax = H[imax]
+
+                # set parameter with maximum information gain
+                self.Hmaxparam = col
+
+    def __str__(self):
+        if self.is_leaf:
+            return f"Leaf: target class='{self.classification}'"
+        else:
+            return f"Node:\n\tleft: {self.Hmaxparam} <= {self.H[self.Hmaxparam]['splitvalue']}\n\tright: {self.Hmaxparam} > {self.H[self.Hmaxparam]['splitvalue']}"
+
+    def __repr__(self):
+        return str(self)
+
+    def __len__(self):
+        return len(self.y)
+
+    @staticmethod
+    def get_entropy(y):
+        """
+        Calculate entropy for the node.
+
+        Parameters
+        ----------
+        y: array_like
+            The array of categories/labels.
+
+        Returns
+        -------
+        Z: float
+            Entropy of node.
+        """
+
+        return entropy(np.unique(y, return_counts=True)[1])
+
+    def information_gain(self, parameter, pentropy):
+        """
+        Determine the information gain when splitting at each
+        value of a given parameter.
+
+        Parameters
+        ----------
+        parameter: str
+            The name of the parameter on which to calculate the
+            information gain.
+        pentropy: float
+            Parent node entropy.
+        """
+
+        x = self.X[:, self.colnames.index(parameter)]
+        _, gains, runs = split_gains(x, self.yidx, pentropy)
+
+        return gains[runs]
+
+    @property
+    def classification(self):
+        # get most probable value for classification
+        return self.categories[np.argmax(self.numbers)]
+
+    @property
+    def has_children(self):
+        return True if len(self.children) > 0 else False
+
+    def add_child(self, child):
+        self.children.append(child)
+
+
+def build_tree(X, yname, min_leaf_points=5, max_depth=np.inf):
+    # list containing the tree
+    treenodes = []
+
+    treenodes.append(Node(X, X[yname]))
+
+    # queue of end nodes (not leaves and without children) in the order
+    # they were added to the tree
+    endnodes = deque(node for node in treenodes if not node.is_leaf)
+
+    # build tree
+    while len(endnodes) > 0:
+        # create new node with split
+        parent = endnodes.popleft()
+
+        col = parent.colnames.index(parent.Hmaxparam)
+        low = parent.X[:, col] <= parent.H[parent.Hmaxparam]["splitvalue"]
+        high = ~low
+
+        for ci in [low, high]:
+            newnode = Node(
+                parent.X[ci],
+                parent.y[ci],
+                parent=parent,
+                colnames=parent.colnames,
+            )
+
+            # set when we hit a leaf
+            if len(newnode) < min_leaf_points or newnode.depth > max_depth:
+                parent.is_leaf = True
+                parent.children = []  # make sure children is empty
+                break
+
+            # add in child
+            parent.add_child(newnode)
+
+            # add to list of nodes
+            treenodes.append(newnode)
+
+            if not newnode.is_leaf:
+                endnodes.append(newnode)
+
+    return treenodes
+
+
+class DecisionTree:
+    """
+    A decision tree classifier stored as parallel arrays, with an entry for
+    each node of:
+
+    * ``feature``: the index of the feature split on (-1 for leaves)
+    * ``threshold``: the split value (points with values <= this go left)
+    * ``left`` and ``right``: the indices of the child nodes (-1 for leaves)
+    * ``counts``: the number of training points of each class
+    * ``depth``: the depth of the node
+
+    Nodes are numbered in the order they are created (breadth first), with
+    the root node being 0.
+
+    Parameters
+    ----------
+    min_leaf_points: int
+        A node becomes a leaf if splitting it would give a child with fewer
+        than this number of points.
+    max_depth: int
+        The maximum depth of the tree.
+    max_features: int, float or str
+        The number of randomly chosen features to consider when splitting
+        each node (as used in a random forest). This can be an integer, a
+        fraction of the number of features, "sqrt" or "log2". By default all
+        features are used.
+    random_state: int or numpy.random.Generator
+        The random number generator (or seed) used to choose features.
+    """
+
+    def __init__(self, min_leaf_points=5, max_depth=np.inf, max_features=None, random_state=None):
+        self.min_leaf_points = min_leaf_points
+        self.max_depth = max_depth
+        self.max_features = max_features
+        self.random_state = random_state
+
+    def _nfeatures(self, nfeatures):
+        """
+        Get the number of features to consider at each split.
+        """
+
+        if self.max_features is None:
+            return nfeatures
+        elif self.max_features == "sqrt":
+            n = np.sqrt(nfeatures)
+        elif self.max_features == "log2":
+            n = np.log2(nfeatures)
+        elif isinstance(self.max_features, float):
+            n = self.max_features * nfeatures
+        else:
+            n = self.max_features
+
+        return int(min(max(n, 1), nfeatures))
+
+    def _best_split(self, X, y, idx, pentropy):
+        """
+        Find the feature and value giving the maximum information gain for
+        splitting the points idx, returning the feature index and split value.
+        """
+
+        if self._maxfeatures < X.shape[1]:
+            features = self._rng.permutation(X.shape[1])[: self._maxfeatures]
+        else:
+            features = range(X.shape[1])
+
+        Hmax = -np.inf
+        for f in features:
+            x = X[idx, f]
+            _, gains, runs = split_gains(x, y[idx], pentropy)
+
+            # use the first point giving the maximum gain (as for Node)
+            H = gains[runs]
+            imax = np.argmax(H)
+
+            if H[imax] > Hmax:
+                Hmax = H[imax]
+                feature = f
+                threshold = x[imax]
+
+        return feature, threshold
+
+    def fit(self, X, y, sample_indices=None, classes=None):
+        """
+        Build the tree.
+
+        Parameters
+        ----------
+        X: array_like
+            A 2D array of parameter values, with a column for each parameter
+            (or a pandas DataFrame).
+        y: array_like
+            The array of categories/labels for each point.
+        sample_indices: array_like
+            The indices of the points (which can be repeated, e.g., for a
+            bootstrap sample) to build the tree from. By default all points
+            are used.
+        classes: array_like
+            The sorted set of all possible categories/labels. By default
+            these are the unique values of y.
+
+        Returns
+        -------
+        tree: DecisionTree
+            The tree itself.
+        """
+
+        if hasattr(X, "columns"):
+            self.colnames = list(X.columns)
+        X = np.asarray(X, dtype=float)
+        if classes is None:
+            self.classes, y = np.unique(y, return_inverse=True)
+        else:
+            self.classes = np.asarray(classes)
+            y = np.searchsorted(self.classes, y)
+        nclasses = len(self.classes)
+
+        idx = np.arange(len(y)) if sample_indices is None else np.asarray(sample_indices)
+
+        self._rng = np.random.default_rng(self.random_state)
+        self._maxfeatures = self._nfeatures(X.shape[1])
+
+        feature = [-1]
+        threshold = [np.nan]
+        left = [-1]
+        right = [-1]
+        counts = [np.bincount(y[idx], minlength=nclasses)]
+        depth = [0]
+
+        # queue of nodes to split and indices of the points in them
+        queue = deque([(0, idx)])
+
+        while len(queue) > 0:
+            node, idx = queue.popleft()
+
+            # a leaf if only one category
+            if np.count_nonzero(counts[node]) < 2:
+                continue
+
+            f, value = self._best_split(X, y, idx, entropy(counts[node]))
+
+            low = X[idx, f] <= value
+            children = [idx[low], idx[~low]]
+
+            # set when we hit a leaf
+            # (or if the split would leave a child empty)
+            if (
+                min(len(children[0]), len(children[1])) < max(self.min_leaf_points, 1)
+                or depth[node] + 1 > self.max_depth
+            ):
+                continue
+
+            feature[node] = f
+            threshold[node] = value
+
+            for cidx, child in zip(children, [left, right]):
+                child[node] = len(feature)
+                queue.append((len(feature), cidx))
+
+                feature.append(-1)
+                threshold.append(np.nan)
+                left.append(-1)
+                right.append(-1)
+                counts.append(np.bincount(y[cidx], minlength=nclasses))
+                depth.append(depth[node] + 1)
+
+        self.feature = np.array(feature)
+        self.threshold = np.array(threshold)
+        self.left = np.array(left)
+        self.right = np.array(right)
+        self.counts = np.array(counts)
+        self.depth = np.array(depth)
+
+        return self
+
+    def __len__(self):
+        return len(self.feature)
+
+    @property
+    def is_leaf(self):
+        return self.feature < 0
+
+    @property
+    def n_leaves(self):
+        return np.count_nonzero(self.is_leaf)
+
+    def apply(self, X):
+        """
+        Get the index of the leaf node that each point ends up in.
+
+        Parameters
+        ----------
+        X: array_like
+            A 2D array of parameter values, with a column for each parameter.
+        """
+
+        X = np.asarray(X, dtype=float)
+        nodes = np.zeros(len(X), dtype=int)
+
+        # move all points that are not yet in a leaf down a level
+        active = np.arange(len(X))
+        while len(active) > 0:
+            anodes = nodes[active]
+            split = self.feature[anodes] >= 0
+            active = active[split]
+            anodes = anodes[split]
+
+            low = X[active, self.feature[anodes]] <= self.threshold[anodes]
+            nodes[active] = np.where(low, self.left[anodes], self.right[anodes])
+
+        return nodes
+
+    def predict_proba(self, X):
+        """
+        Get the fraction of training points of each class in the leaf that
+        each point ends up in.
+        """
+
+        counts = self.counts[self.apply(X)]
+        return counts / counts.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        """
+        Get the most probable classification for each point.
+
+        Parameters
+        ----------
+        X: array_like
+            A 2D array of parameter values, with a column for each parameter.
+        """
+
+        return self.classes[np.argmax(self.counts[self.apply(X)], axis=1)]
+
+
+# the training data shared with the worker processes
+_shared = {}
+
+
+def _attach_shared(names, shapes, dtypes):
+    """
+    Attach to the shared memory blocks holding the training data in a
+    worker process.
+    """
+
+    for key, name, shape, dtype in zip(["X", "y"], names, shapes, dtypes):
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key + "shm"] = shm  # keep a reference so it is not closed
+        _shared[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _fit_trees(seeds, kwargs, classes, bootstrap):
+    """
+    Fit a set of trees (one for each random seed) to the shared training data,
+    returning the trees, and their out-of-bag points and class probabilities.
+    """
+
+    X = _shared["X"]
+    y = _shared["y"]
+    N = len(y)
+
+    results = []
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        tree = DecisionTree(random_state=rng, **kwargs)
+
+        if bootstrap:
+            idx = rng.integers(0, N, N)
+            oob = np.flatnonzero(np.bincount(idx, minlength=N) == 0)
+        else:
+            idx = None
+            oob = np.zeros(0, dtype=int)
+
+        tree.fit(X, y, sample_indices=idx, classes=classes)
+        del tree._rng
+
+        results.append((tree, oob, tree.predict_proba(X[oob])))
+
+    return results
+
+
+class RandomForest:
+    """
+    A random forest classifier: an ensemble of decision trees, each built
+    from a bootstrap sample of the training points and only considering a
+    random subset of the features at each split. Class probabilities are the
+    average of those of the trees.
+
+    Parameters
+    ----------
+    n_trees: int
+        The number of trees.
+    max_features: int, float or str
+        The number of features to consider at each split (see
+        :class:`DecisionTree`). Use None for bagging with all features.
+    bootstrap: bool
+        Build each tree from a bootstrap sample of the points.
+    min_leaf_points: int
+        The minimum number of points in a leaf of each tree.
+    max_depth: int
+        The maximum depth of each tree.
+    nprocs: int
+        The number of processes to build the trees with (by default the trees
+        are built in the current process).
+    random_state: int
+        The random seed.
+    """
+
+    def __init__(
+        self,
+        n_trees=100,
+        max_features="sqrt",
+        bootstrap=True,
+        min_leaf_points=1,
+        max_depth=np.inf,
+        nprocs=None,
+        random_state=None,
+    ):
+        self.n_trees = n_trees
+        self.max_features = max_features
+        self.bootstrap = bootstrap
+        self.min_leaf_points = min_leaf_points
+        self.max_depth = max_depth
+        self.nprocs = nprocs
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        """
+        Build the forest, and calculate the out-of-bag error (the error rate
+        when classifying each point with only the trees that were not built
+        using it).
+
+        Parameters
+        ----------
+        X: array_like
+            A 2D array of parameter values, with a column for each parameter
+            (or a pandas DataFrame).
+        y: array_like
+            The array of categories/labels for each point.
+
+        Returns
+        -------
+        forest: RandomForest
+            The forest itself.
+        """
+
+        if hasattr(X, "columns"):
+            self.colnames = list(X.columns)
+        X = np.ascontiguousarray(X, dtype=float)
+        self.classes, y = np.unique(y, return_inverse=True)
+
+        kwargs = {
+            "min_leaf_points": self.min_leaf_points,
+            "max_depth": self.max_depth,
+            "max_features": self.max_features,
+        }
+
+        # a seed for each tree (independent of the number of processes)
+        seeds = np.random.SeedSequence(self.random_state).spawn(self.n_trees)
+        nprocs = 1 if self.nprocs is None else self.nprocs
+        chunks = [seeds[i::nprocs] for i in range(nprocs) if len(seeds[i::nprocs]) > 0]
+        args = (kwargs, np.arange(len(self.classes)), self.bootstrap)
+
+        # put the training data in shared memory
+        blocks = []
+        try:
+            for array in [X, y]:
+                shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks.append(shm)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+
+            initargs = (
+                [shm.name for shm in blocks],
+                [X.shape, y.shape],
+                [X.dtype, y.dtype],
+            )
+
+            if nprocs == 1:
+                _attach_shared(*initargs)
+                results = [_fit_trees(chunk, *args) for chunk in chunks]
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=nprocs, initializer=_attach_shared, initargs=initargs
+                ) as executor:
+                    results = list(
+                        executor.map(_fit_trees, chunks, *[[arg] * len(chunks) for arg in args])
+                    )
+        finally:
+            _shared.clear()
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+        # put the trees back in seed order
+        results = [results[i % nprocs][i // nprocs] for i in range(self.n_trees)]
+        self.trees = [tree for tree, _, _ in results]
+        self._stack()
+
+        # out-of-bag votes
+        votes = np.zeros((len(y), len(self.classes)))
+        for _, oob, proba in results:
+            votes[oob] += proba
+
+        hasvotes = votes.sum(axis=1) > 0
+        self.oob_points = np.count_nonzero(hasvotes)
+        if self.oob_points > 0:
+            self.oob_error = np.mean(np.argmax(votes[hasvotes], axis=1) != y[hasvotes])
+        else:
+            self.oob_error = np.nan
+
+        return self
+
+    def _stack(self):
+        """
+        Concatenate the arrays of all the trees, so that all trees can be
+        evaluated at once.
+        """
+
+        sizes = np.array([len(tree) for tree in self.trees])
+        self.roots = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        offsets = np.repeat(self.roots, sizes)
+
+        self.feature = np.concatenate([tree.feature for tree in self.trees])
+        self.threshold = np.concatenate([tree.threshold for tree in self.trees])
+        self.left = np.concatenate([tree.left for tree in self.trees]) + offsets
+        self.right = np.concatenate([tree.right for tree in self.trees]) + offsets
+
+        counts = np.concatenate([tree.counts for tree in self.trees])
+        self.proba = counts / counts.sum(axis=1, keepdims=True)
+
+    def apply(self, X):
+        """
+        Get the index (in the concatenated node arrays) of the leaf that each
+        point ends up in for each tree, as an (n_trees x n_points) array.
+        """
+
+        X = np.asarray(X, dtype=float)
+        nodes = np.repeat(self.roots[:, np.newaxis], len(X), axis=1).ravel()
+        points = np.tile(np.arange(len(X)), len(self.trees))
+
+        # move all points that are not yet in a leaf down a level
+        active = np.arange(len(nodes))
+        while len(active) > 0:
+            anodes = nodes[active]
+            split = self.feature[anodes] >= 0
+            active = active[split]
+            anodes = anodes[split]
+
+            low = X[points[active], self.feature[anodes]] <= self.threshold[anodes]
+            nodes[active] = np.where(low, self.left[anodes], self.right[anodes])
+
+        return nodes.reshape(len(self.trees), len(X))
+
+    def predict_proba(self, X, batchsize=10000):
+        """
+        Get the class probabilities for each point, averaged over the trees.
+        The points are classified in batches of batchsize points.
+        """
+
+        X = np.asarray(X, dtype=float)
+        proba = np.empty((len(X), len(self.classes)))
+        for start in range(0, len(X), batchsize):
+            nodes = self.apply(X[start : start + batchsize])
+            proba[start : start + batchsize] = self.proba[nodes].mean(axis=0)
+
+        return proba
+
+    def predict(self, X, batchsize=10000):
+        """
+        Get the most probable classification for each point.
+        """
+
+        return self.classes[np.argmax(self.predict_proba(X, batchsize=batchsize), axis=1)]
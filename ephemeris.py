@@ -0,0 +1,206 @@
+"""
+Load the JPL ephemeris tables used in SolSym.ipynb (from
+http://www.astro.gla.ac.uk/honours/labs/solar_system/JPL%20coordinates/),
+e.g.
+
+>>> jpldata = load_ephemerides()
+>>> X = np.concatenate([jpldata[planet][0,1:] for planet in jpldata])
+
+Each table is an array with columns of the Julian date and the x, y, z, vx,
+vy and vz values (in AU and AU/day).
+
+Tables are read from local copies of the files if available (in the datadir
+directory, or the SOLSYM_DATA environment variable) and only downloaded if
+not. The parsed tables are stored in a content-addressed cache (in cachedir,
+or the SOLSYM_CACHE environment variable, defaulting to ~/.cache/solsym) keyed
+by the SHA256 hash of the original file, along with an index of which file
+(or URL) gave which hash. Cached tables are stored as column-major NumPy
+arrays and memory-mapped when loaded, so after the first time they are
+loaded without any parsing or network access.
+"""
+
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+
+BASEURL = "http://www.astro.gla.ac.uk/honours/labs/solar_system/JPL%20coordinates/{}"
+
+# use ordered dictionary so that planets are in the right order
+JPLFILES = OrderedDict()
+JPLFILES["Sun"] = "sun.txt"
+JPLFILES["Mercury"] = "mercury.txt"
+JPLFILES["Venus"] = "venus.txt"
+JPLFILES["Earth"] = "earthmoon.txt"
+JPLFILES["Mars"] = "mars.txt"
+JPLFILES["Jupiter"] = "jupiter.txt"
+JPLFILES["Saturn"] = "saturn.txt"
+JPLFILES["Uranus"] = "uranus.txt"
+JPLFILES["Neptune"] = "neptune.txt"
+JPLFILES["Pluto"] = "pluto.txt"
+
+COLUMNS = ["jd", "x", "y", "z", "vx", "vy", "vz"]
+
+
+def parse_ephemeris(content):
+    """
+    Parse the table between the $$SOE and $$EOE markers of a JPL ephemeris
+    file, returning an array with columns given by COLUMNS.
+
+    Args:
+        content (bytes or str): the contents of the file
+    """
+
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", "replace")
+
+    match = re.search(r"\$\$SOE(.*?)\$\$EOE", content, flags=re.S)
+    if match is None:
+        raise ValueError("No $$SOE...$$EOE block found in ephemeris file")
+
+    # each row is "JD, calendar date, x, y, z, vx, vy, vz,"
+    rows = [line.split(",") for line in match.group(1).splitlines() if line.strip()]
+    return np.array([[row[0]] + row[2:8] for row in rows], dtype=float)
+
+
+class EphemerisCache(object):
+    """
+    A content-addressed on-disk cache of parsed ephemeris tables.
+
+    Args:
+        cachedir (str): the cache directory (defaults to the SOLSYM_CACHE
+            environment variable or ~/.cache/solsym)
+    """
+
+    def __init__(self, cachedir=None):
+        if cachedir is None:
+            cachedir = os.environ.get(
+                "SOLSYM_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "solsym")
+            )
+
+        self.cachedir = cachedir
+        self.indexfile = os.path.join(cachedir, "index.json")
+
+    @staticmethod
+    def key(content):
+        """The cache key (SHA256 hash) of some file contents"""
+        return hashlib.sha256(content).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cachedir, "{}.npy".format(key))
+
+    def _write(self, path, write):
+        # write to a temporary file first, so partial files are never seen
+        if not os.path.isdir(self.cachedir):
+            os.makedirs(self.cachedir)
+        tmppath = "{}.tmp{}".format(path, os.getpid())
+        with open(tmppath, "wb") as fp:
+            write(fp)
+        os.replace(tmppath, path)
+
+    def __contains__(self, key):
+        return os.path.isfile(self.path(key))
+
+    def load(self, key):
+        """Load a (memory-mapped) table from the cache"""
+        return np.load(self.path(key), mmap_mode="r").T
+
+    def store(self, content):
+        """
+        Parse and store the table from some file contents (if not already
+        cached), returning the cache key.
+        """
+
+        key = self.key(content)
+        if key not in self:
+            # store each column contiguously
+            table = np.ascontiguousarray(parse_ephemeris(content).T)
+            self._write(self.path(key), lambda fp: np.save(fp, table))
+
+        return key
+
+    @property
+    def index(self):
+        """The index of source file names/URLs to cache keys"""
+        try:
+            with open(self.indexfile, "r") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    def add_to_index(self, source, key):
+        index = self.index
+        if index.get(source, None) != key:
+            index[source] = key
+            self._write(
+                self.indexfile, lambda fp: fp.write(json.dumps(index, indent=1).encode())
+            )
+
+    def lookup(self, source):
+        """Get the cache key for a source file name/URL, or None if not cached"""
+        key = self.index.get(source, None)
+        return key if key is not None and key in self else None
+
+
+def load_ephemeris(filename, datadir=None, cache=None, baseurl=BASEURL, offline=False):
+    """
+    Load an ephemeris table (see the module docstring for the order in which
+    local files, the cache and the network are tried).
+
+    Args:
+        filename (str): the ephemeris file name, e.g., "sun.txt"
+        datadir (str): a directory containing local copies of the ephemeris
+            files (defaults to the SOLSYM_DATA environment variable)
+        cache (EphemerisCache): the cache to use (defaults to the default
+            cache directory)
+        baseurl (str): the URL format string to download files from
+        offline (bool): if True never try to download files, raising an
+            IOError if a table is not available locally
+    """
+
+    cache = EphemerisCache() if cache is None else cache
+    datadir = os.environ.get("SOLSYM_DATA", None) if datadir is None else datadir
+
+    # local file
+    if datadir is not None and os.path.isfile(os.path.join(datadir, filename)):
+        with open(os.path.join(datadir, filename), "rb") as fp:
+            return cache.load(cache.store(fp.read()))
+
+    # previously downloaded file
+    url = baseurl.format(filename)
+    key = cache.lookup(url)
+    if key is not None:
+        return cache.load(key)
+
+    if offline:
+        raise IOError("Ephemeris file {} is not available offline".format(filename))
+
+    import requests
+
+    response = requests.get(url)
+    response.raise_for_status()
+
+    key = cache.store(response.content)
+    cache.add_to_index(url, key)
+
+    return cache.load(key)
+
+
+def load_ephemerides(bodies=None, **kwargs):
+    """
+    Load the ephemeris tables for a set of bodies (defaulting to all those
+    in JPLFILES) into an ordered dictionary. Keyword arguments are passed to
+    :func:`load_ephemeris`.
+    """
+
+    bodies = list(JPLFILES.keys()) if bodies is None else bodies
+
+    jpldata = OrderedDict()
+    for body in bodies:
+        jpldata[body] = load_ephemeris(JPLFILES[body], **kwargs)
+
+    return jpldata
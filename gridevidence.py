@@ -0,0 +1,193 @@
+"""
+Log evidences, KL divergences and marginal posteriors for log-likelihoods on
+N-dimensional grids (integrated with the trapezium rule), e.g., the 130^4
+grids over h0, phi0, psi and cos(iota) in
+SimulatedSignalTestsSNRvsEvidence.ipynb:
+
+>>> axes = [h0s, phi0s, psis, cosiotas]
+>>> result = integrate_grid(loglikelihood, axes, names=["h0", "phi0", "psi", "cosiota"])
+>>> result.logZ, result.kldivergence
+>>> pl.plot(h0s, result.marginal("h0"))
+
+The grid is processed in chunks along its first axis, with running
+(rescaled) sums of exp(log-likelihood + log-prior) for the evidence, for the
+posterior expectation of the log-likelihood (for the KL divergence) and for
+the marginal posteriors of each axis. So, the log-likelihood for the full
+grid never has to be held in memory, and the evidence, KL divergence and all
+the 1D marginal posteriors come from a single pass over it.
+"""
+
+import numpy as np
+
+from gridlikelihood import log_trapz_weights
+
+
+class GridResult:
+    """
+    The results of :func:`integrate_grid`.
+
+    Attributes:
+        axes (list): the grid points for each axis
+        names (list): the names of each axis
+        logZ (float): the log evidence
+        kldivergence (float): the KL divergence of the posterior from the
+            prior (in nats)
+        logmarginals (list): the normalised log marginal posterior density
+            for each axis
+        maxloglikelihood (float): the maximum log-likelihood on the grid
+        maxposition (tuple): the grid indices of the maximum log-likelihood
+    """
+
+    def __init__(self, axes, names, logZ, kldivergence, logmarginals, maxloglikelihood, maxposition):
+        self.axes = axes
+        self.names = names
+        self.logZ = logZ
+        self.kldivergence = kldivergence
+        self.logmarginals = logmarginals
+        self.maxloglikelihood = maxloglikelihood
+        self.maxposition = maxposition
+
+    def _index(self, axis):
+        return self.names.index(axis) if isinstance(axis, str) else axis
+
+    def logmarginal(self, axis):
+        """The normalised log marginal posterior for an axis (given by index or name)"""
+        return self.logmarginals[self._index(axis)]
+
+    def marginal(self, axis):
+        """The normalised marginal posterior for an axis (given by index or name)"""
+        return np.exp(self.logmarginal(axis))
+
+
+def _grid_values(values, axes, start, stop):
+    # get the values of a function/array for the chunk start:stop of the first axis
+    if callable(values):
+        points = np.meshgrid(axes[0][start:stop], *axes[1:], indexing="ij", sparse=True)
+        return values(*points)
+
+    return values[start:stop]
+
+
+def integrate_grid(loglikelihood, axes, logprior=None, names=None, chunksize=None, maxchunk=2 ** 22):
+    """
+    Calculate the log evidence, KL divergence and marginal posteriors for a
+    log-likelihood on an N-dimensional grid.
+
+    Args:
+        loglikelihood (callable or array): a function that takes the grid
+            points for each axis (as broadcastable arrays, as from
+            ``np.meshgrid(..., indexing="ij", sparse=True)``) and returns the
+            log-likelihood at those points, or an array (e.g., a memory
+            mapped array) containing the log-likelihood over the grid
+        axes (list): the (1D) grid points for each axis
+        logprior (callable, array or list): the (normalised) log prior, either
+            a function or array as for loglikelihood, or a list of the log
+            prior for each axis if it is separable. Defaults to a uniform
+            prior over the grid's extent.
+        names (list): names for each axis
+        chunksize (int): the number of points in the first axis to process
+            at once. Defaults to the number giving chunks of at most maxchunk
+            grid points.
+        maxchunk (int): the maximum number of grid points in a chunk if
+            chunksize is not given
+
+    Returns:
+        GridResult: the results
+    """
+
+    axes = [np.asarray(axis, dtype=float) for axis in axes]
+    shape = tuple(len(axis) for axis in axes)
+    ndim = len(axes)
+
+    names = list(range(ndim)) if names is None else list(names)
+    if len(names) != ndim:
+        raise ValueError("Number of names must match the number of axes")
+
+    if chunksize is None:
+        chunksize = max(1, maxchunk // int(np.prod(shape[1:], dtype=np.int64)))
+
+    def broadcast(values, i):
+        # reshape a 1D array to broadcast along axis i
+        newshape = [1] * ndim
+        newshape[i] = -1
+        return np.reshape(values, newshape)
+
+    logweights = [log_trapz_weights(axis, len(axis)) for axis in axes]
+
+    if logprior is None:
+        logprior = [np.full(n, -np.log(axis[-1] - axis[0])) for n, axis in zip(shape, axes)]
+
+    separable = isinstance(logprior, (list, tuple))
+    if separable:
+        logprior = [np.broadcast_to(np.asarray(lp, dtype=float), (n,)) for lp, n in zip(logprior, shape)]
+
+    # running sums of exp(a - amax) and exp(a - amax) * log-likelihood, where
+    # a is the log of the (weighted) likelihood times prior
+    amax = -np.inf
+    suma = 0.
+    sumloglike = 0.
+
+    logmarginals = [np.full(n, -np.inf) for n in shape]
+
+    maxloglikelihood = -np.inf
+    maxposition = None
+
+    for start in range(0, shape[0], chunksize):
+        stop = min(start + chunksize, shape[0])
+        chunkshape = (stop - start,) + shape[1:]
+
+        logl = np.broadcast_to(
+            np.asarray(_grid_values(loglikelihood, axes, start, stop), dtype=float), chunkshape
+        )
+
+        a = logl + broadcast(logweights[0][start:stop], 0)
+        for i in range(1, ndim):
+            a += broadcast(logweights[i], i)
+
+        if separable:
+            a += broadcast(logprior[0][start:stop], 0)
+            for i in range(1, ndim):
+                a += broadcast(logprior[i], i)
+        else:
+            a += _grid_values(logprior, axes, start, stop)
+
+        imax = np.argmax(logl)
+        if logl.flat[imax] > maxloglikelihood:
+            maxloglikelihood = logl.flat[imax]
+            maxposition = np.unravel_index(imax, chunkshape)
+            maxposition = (maxposition[0] + start,) + maxposition[1:]
+
+        chunkmax = np.max(a)
+        if chunkmax == -np.inf:
+            continue
+
+        # exponentiate (once) relative to the chunk maximum
+        ea = np.exp(a - chunkmax, out=a)
+
+        # add to the running sums, rescaled to the new maximum
+        newmax = max(amax, chunkmax)
+        scale, chunkscale = np.exp(amax - newmax), np.exp(chunkmax - newmax)
+        amax = newmax
+
+        suma = suma * scale + np.sum(ea) * chunkscale
+        sumloglike = sumloglike * scale + np.sum(ea * np.where(ea > 0., logl, 0.)) * chunkscale
+
+        # marginals (removing the weight of the marginalised axis itself)
+        with np.errstate(divide="ignore"):
+            for i in range(ndim):
+                others = tuple(j for j in range(ndim) if j != i)
+                marg = np.log(np.sum(ea, axis=others)) + chunkmax
+
+                if i == 0:
+                    logmarginals[0][start:stop] = marg - logweights[0][start:stop]
+                else:
+                    logmarginals[i] = np.logaddexp(logmarginals[i], marg - logweights[i])
+
+    logZ = amax + np.log(suma)
+
+    # KL divergence = <log(posterior/prior)> = <log-likelihood> - log evidence
+    kldivergence = sumloglike / suma - logZ
+
+    logmarginals = [marg - logZ for marg in logmarginals]
+
+    return GridResult(axes, names, logZ, kldivergence, logmarginals, maxloglikelihood, maxposition)
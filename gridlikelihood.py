@@ -0,0 +1,164 @@
+"""
+Vectorised Gaussian log-likelihoods (and evidences) evaluated over a grid of
+signal templates, as used in CoherentVsIncoherent.ipynb and
+PosteriorOverlap.ipynb, e.g., for a sinusoid with unknown phase
+
+>>> phis = np.linspace(0., 2.*np.pi, 500)
+>>> like = GaussianGridLikelihood(np.sin(2.*np.pi*f*ts + phis[:, np.newaxis]))
+>>> logZs, logZn = like.log_evidence(data, sigmas, phis, logprior=-np.log(2.*np.pi))
+
+The likelihood for each template h is expanded as
+
+  -0.5 (d - h).(d - h)/sigma^2 = -0.5 (d.d - 2 d.h + h.h)/sigma^2,
+
+so the h.h terms are calculated once, and the d.h terms for all templates
+(and any number of data realisations and noise levels) with a single matrix
+product, rather than looping over the grid.
+"""
+
+import numpy as np
+from scipy.special import logsumexp
+
+
+def log_trapz_weights(xvs, n):
+    """
+    The log of the trapezium rule weights for n points on a grid.
+
+    Args:
+        xvs (array or float): the (1D) grid of points, or the spacing between
+            points for a uniform grid
+        n (int): the number of points
+    """
+
+    if np.ndim(xvs) == 0:
+        deltas = np.full(n - 1, float(xvs))
+    else:
+        deltas = np.diff(np.asarray(xvs, dtype=float))
+
+    if len(deltas) != n - 1:
+        raise ValueError("Grid length does not match the length of the integration axis")
+
+    # each point's weight is half the width of the intervals either side of it
+    weights = np.zeros(n)
+    weights[:-1] += 0.5 * deltas
+    weights[1:] += 0.5 * deltas
+
+    with np.errstate(divide="ignore"):
+        return np.log(weights)
+
+
+def logtrapz(lys, xvs, axis=-1):
+    """
+    The log of the trapezium rule integral of exp(lys) along an axis.
+
+    Args:
+        lys (array): the log of the function values
+        xvs (array or float): the (1D) grid of points along the axis, or the
+            spacing between points for a uniform grid
+        axis (int): the axis to integrate along
+    """
+
+    lys = np.asarray(lys, dtype=float)
+    n = lys.shape[axis]
+
+    shape = [1] * lys.ndim
+    shape[axis] = n
+
+    return logsumexp(lys + log_trapz_weights(xvs, n).reshape(shape), axis=axis)
+
+
+class GaussianGridLikelihood:
+    """
+    The Gaussian log-likelihood for a grid of signal templates, in white
+    noise of known standard deviation.
+
+    Args:
+        templates (array): an array of shape (ngrid, ntimes) with a signal
+            template for each grid point
+        segments (list): a list of slices (or index arrays) of the time
+            series, e.g., [slice(None), slice(0, 50), slice(50, None)] for
+            the full data and its two halves. The likelihoods are calculated
+            for each segment independently. Defaults to the whole time
+            series.
+    """
+
+    def __init__(self, templates, segments=None):
+        self.templates = np.atleast_2d(np.asarray(templates, dtype=float))
+        self.segments = [slice(None)] if segments is None else list(segments)
+
+        ntimes = self.templates.shape[-1]
+        self.nsamples = np.array([len(np.arange(ntimes)[s]) for s in self.segments])
+
+        # the template h.h terms for each segment, shape (nsegments, ngrid)
+        self.hh = np.stack([np.sum(self.templates[:, s] ** 2, axis=-1) for s in self.segments])
+
+    def products(self, data):
+        """
+        Get the d.d and d.h terms for each segment of the data.
+
+        Args:
+            data (array): the data, with shape (..., ntimes)
+
+        Returns:
+            tuple: the d.d terms, with shape (..., nsegments), and the d.h
+            terms, with shape (..., nsegments, ngrid)
+        """
+
+        data = np.asarray(data, dtype=float)
+
+        dd = np.stack([np.sum(data[..., s] ** 2, axis=-1) for s in self.segments], axis=-1)
+        dh = np.stack([data[..., s] @ self.templates[:, s].T for s in self.segments], axis=-2)
+
+        return dd, dh
+
+    def __call__(self, data, sigma):
+        """
+        Get the log-likelihoods for each template, and for noise alone.
+
+        Args:
+            data (array): the data, with shape (..., ntimes)
+            sigma (array or float): the noise standard deviation, which must
+                broadcast with the data's leading dimensions (...)
+
+        Returns:
+            tuple: the log-likelihoods, with shape (..., nsegments, ngrid),
+            and the noise log-likelihoods, with shape (..., nsegments)
+        """
+
+        dd, dh = self.products(data)
+        var = np.asarray(sigma, dtype=float)[..., np.newaxis] ** 2
+
+        lognoise = -0.5 * self.nsamples * np.log(2. * np.pi * var) - 0.5 * dd / var
+        loglike = lognoise[..., np.newaxis] + (dh - 0.5 * self.hh) / var[..., np.newaxis]
+
+        return loglike, lognoise
+
+    def log_evidence(self, data, sigma, grid, logprior=0.):
+        """
+        Get the log evidence, marginalised over the grid with the trapezium
+        rule, and the noise log evidence.
+
+        Args:
+            data (array): the data, with shape (..., ntimes)
+            sigma (array or float): the noise standard deviation
+            grid (array or float): the grid points (or spacing) for the
+                templates
+            logprior (array or float): the log prior for each grid point
+
+        Returns:
+            tuple: the signal and noise log evidences, each with shape
+            (..., nsegments)
+        """
+
+        loglike, lognoise = self(data, sigma)
+        return logtrapz(loglike + logprior, grid), lognoise
+
+    def log_posterior(self, data, sigma, grid, logprior=0.):
+        """
+        Get the normalised log posterior over the grid, with shape
+        (..., nsegments, ngrid) (see :meth:`log_evidence` for the arguments).
+        """
+
+        loglike, _ = self(data, sigma)
+        logpost = loglike + logprior
+        return logpost - logtrapz(logpost, grid)[..., np.newaxis]
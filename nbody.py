@@ -0,0 +1,546 @@
+"""
+A general N-body gravitational interaction simulator (e.g. for the solar
+system simulations in SolSym.ipynb).
+
+The gravitational accelerations of all the bodies are calculated in one go,
+with the separation of each pair of bodies only being calculated once, e.g.
+
+>>> from scipy.integrate import odeint
+>>> system = NBody(GM)
+>>> y = odeint(system.rhs, X, times)
+
+where (as for ``grav`` in SolSym.ipynb) ``GM`` are the masses of the bodies
+multiplied by G, and ``X`` contains the positions and velocities of each body,
+e.g. [x1, y1, z1, vx1, vy1, vz1, x2, ...].
+
+Alternatively, the system can be evolved with a fixed time step using one of
+the steppers in STEPPERS (velocity Verlet/leapfrog, 4th order Yoshida/
+Forest-Ruth, or 4th order Runge-Kutta), e.g.
+
+>>> pos, vel = unpack_state(X)
+>>> integrator = Integrator(system, stepper="yoshida")
+>>> times, positions, velocities = integrator.run(pos, vel, 1., 36525, every=10)
+"""
+
+import numpy as np
+
+
+class NBody(object):
+    """
+    The gravitational interaction between N bodies.
+
+    Args:
+        masses (array): the masses multiplied by G for each of the bodies
+            (in units using AUs and days for the solar system). These can
+            have leading dimensions (e.g. n_ensemble x n_bodies) to give
+            different masses for different systems.
+    """
+
+    def __init__(self, masses):
+        self.masses = np.asarray(masses, dtype=float)
+        self.nbodies = self.masses.shape[-1]
+
+        # indices of each pair of bodies
+        self.ii, self.jj = np.triu_indices(self.nbodies, 1)
+        self.npairs = len(self.ii)
+
+        # matrix giving the separation vector of each pair from the positions
+        self._separation = np.zeros((self.npairs, self.nbodies))
+        self._separation[np.arange(self.npairs), self.jj] = 1.
+        self._separation[np.arange(self.npairs), self.ii] = -1.
+
+        # matrix to sum the (mass weighted) accelerations from each pair onto
+        # each body, i.e. a_i += m_j (x_j - x_i)/r^3, a_j -= m_i (x_j - x_i)/r^3
+        self._scatter = np.zeros((self.nbodies, 2*self.npairs))
+        self._scatter[self.ii, np.arange(self.npairs)] = 1.
+        self._scatter[self.jj, self.npairs + np.arange(self.npairs)] = -1.
+
+        self.mass_i = self.masses[..., self.ii, np.newaxis]
+        self.mass_j = self.masses[..., self.jj, np.newaxis]
+
+        self._ones = np.ones(3)
+        self._buffers = {}
+
+    def _get_buffers(self, shape):
+        """
+        Get the (preallocated) work arrays for positions with leading
+        dimensions shape.
+        """
+
+        if shape not in self._buffers:
+            pairs = shape + (self.npairs, 3)
+            self._buffers[shape] = {
+                'diff': np.empty(pairs),
+                'sq': np.empty(pairs),
+                'pair': np.empty(shape + (2*self.npairs, 3)),
+                'r2': np.empty(pairs[:-1]),
+                'acc': np.empty(shape + (self.nbodies, 3)),
+            }
+
+        return self._buffers[shape]
+
+    def accelerations(self, positions, out=None):
+        """
+        The gravitational acceleration of each body.
+
+        Args:
+            positions (array): an (n_bodies x 3) array of positions (or an
+                array with extra leading dimensions, e.g. n_ensemble x
+                n_bodies x 3)
+            out (array): an optional array to hold the output. If not given
+                an internal buffer, which is overwritten on the next call, is
+                returned.
+        """
+
+        positions = np.asarray(positions)
+        buf = self._get_buffers(positions.shape[:-2])
+        out = buf['acc'] if out is None else out
+
+        diff = buf['diff']
+        r2 = buf['r2']
+        pair = buf['pair']
+
+        # separation vectors for each pair of bodies
+        np.matmul(self._separation, positions, out=diff)
+
+        # 1/r^3 for each pair
+        np.multiply(diff, diff, out=buf['sq'])
+        np.matmul(buf['sq'], self._ones, out=r2)
+        r2 **= -1.5
+        diff *= r2[..., np.newaxis]
+
+        np.multiply(diff, self.mass_j, out=pair[..., :self.npairs, :])
+        np.multiply(diff, self.mass_i, out=pair[..., self.npairs:, :])
+        np.matmul(self._scatter, pair, out=out)
+
+        return out
+
+    def rhs(self, x, t=None):
+        """
+        The coupled differential equations for the positions and velocities
+        of the bodies, which can be used with :func:`scipy.integrate.odeint`
+        in place of ``grav`` from SolSym.ipynb. A new array is returned (the
+        integrators may keep previous derivatives, e.g. solve_ivp's RK45),
+        with only the intermediate work arrays being preallocated.
+
+        Args:
+            x (array): an array containing the 3D position and velocity
+                vectors of each of the bodies, e.g. [x1, y1, z1, vx1, vy1,
+                vz1, ...] (this can have extra leading dimensions)
+            t (float): a time (not used)
+        """
+
+        x = np.asarray(x)
+        state = x.reshape(x.shape[:-1] + (self.nbodies, 6))
+        Y = np.empty(x.shape)
+
+        Ys = Y.reshape(state.shape)
+        Ys[..., :3] = state[..., 3:]
+        self.accelerations(state[..., :3], out=Ys[..., 3:])
+
+        return Y
+
+    def energy(self, positions, velocities):
+        """
+        The total energy (multiplied by G, as the masses are) of the system.
+
+        Args:
+            positions (array): an (n_bodies x 3) array of positions (or an
+                array with extra leading dimensions)
+            velocities (array): an (n_bodies x 3) array of velocities
+        """
+
+        kinetic = 0.5*np.sum(self.masses*np.sum(velocities**2, axis=-1), axis=-1)
+
+        diff = np.matmul(self._separation, positions)
+        r = np.sqrt(np.sum(diff**2, axis=-1))
+        potential = -np.sum(self.mass_i[..., 0]*self.mass_j[..., 0]/r, axis=-1)
+
+        return kinetic + potential
+
+
+_systems = {}
+
+
+def grav(x, t, masses):
+    """
+    A drop in replacement for ``grav`` from SolSym.ipynb, e.g.
+    ``odeint(grav, X, times, args=(GM,))``, using a (cached) :class:`NBody`
+    for the given masses.
+
+    Args:
+        x (array): an array containing the 3D position and velocity vectors
+            of each of the bodies, e.g. [x1, y1, z1, vx1, vy1, vz1, ...]
+        t (float): a time
+        masses (list): a list of masses multiplied by G for each of the bodies
+    """
+
+    key = tuple(np.ravel(masses))
+    if key not in _systems:
+        _systems[key] = NBody(masses)
+
+    return _systems[key].rhs(x, t)
+
+
+def unpack_state(x):
+    """
+    Get (copies of the) n_bodies x 3 position and velocity arrays from a
+    state vector [x1, y1, z1, vx1, vy1, vz1, ...] (which can have extra
+    leading dimensions).
+    """
+
+    x = np.asarray(x, dtype=float)
+    state = x.reshape(x.shape[:-1] + (-1, 6))
+    return state[..., :3].copy(), state[..., 3:].copy()
+
+
+class VerletStepper(object):
+    """
+    The (2nd order, symplectic) velocity Verlet, aka kick-drift-kick
+    leapfrog, method. This requires one acceleration calculation per step.
+    """
+
+    name = "verlet"
+
+    def setup(self, system, positions):
+        self.system = system
+        self.kick = np.empty_like(positions)
+
+    def substep(self, positions, velocities, acc, dt):
+        # half kick
+        np.multiply(acc, 0.5*dt, out=self.kick)
+        velocities += self.kick
+
+        # drift
+        np.multiply(velocities, dt, out=self.kick)
+        positions += self.kick
+
+        # half kick with the new accelerations
+        self.system.accelerations(positions, out=acc)
+        np.multiply(acc, 0.5*dt, out=self.kick)
+        velocities += self.kick
+
+    def step(self, positions, velocities, acc, dt):
+        """
+        Evolve the positions and velocities (in place) by a time step dt,
+        given the accelerations at the current positions, which are updated
+        (in place) to those at the new positions.
+        """
+
+        self.substep(positions, velocities, acc, dt)
+
+
+class YoshidaStepper(VerletStepper):
+    """
+    The 4th order symplectic method of Forest & Ruth (1990) and Yoshida
+    (1990), made up of three velocity Verlet steps with sizes w1 dt, w0 dt
+    and w1 dt. This requires three acceleration calculations per step.
+    """
+
+    name = "yoshida"
+
+    w1 = 1./(2. - 2.**(1./3.))
+    w0 = -2.**(1./3.)*w1
+
+    def step(self, positions, velocities, acc, dt):
+        for w in [self.w1, self.w0, self.w1]:
+            self.substep(positions, velocities, acc, w*dt)
+
+
+class RK4Stepper(object):
+    """
+    The (non-symplectic) 4th order Runge-Kutta method. This requires four
+    acceleration calculations per step.
+    """
+
+    name = "rk4"
+
+    def setup(self, system, positions):
+        self.system = system
+        self.xt = np.empty_like(positions)
+        self.vt = np.empty_like(positions)
+        self.at = np.empty_like(positions)
+        self.dx = np.empty_like(positions)
+        self.dv = np.empty_like(positions)
+
+    def _stage(self, positions, velocities, vel, acc, h, weight):
+        # get the positions and velocities for the next stage, the
+        # accelerations at those positions, and add them to the sums
+        np.multiply(vel, h, out=self.xt)
+        self.xt += positions
+        np.multiply(acc, h, out=self.vt)
+        self.vt += velocities
+        self.system.accelerations(self.xt, out=self.at)
+
+        self.dx += weight*self.vt
+        self.dv += weight*self.at
+
+    def step(self, positions, velocities, acc, dt):
+        # k1
+        self.dx[...] = velocities
+        self.dv[...] = acc
+
+        # k2 and k3 (at the mid-point) and k4 (at the end point)
+        self._stage(positions, velocities, velocities, acc, 0.5*dt, 2.)
+        self._stage(positions, velocities, self.vt, self.at, 0.5*dt, 2.)
+        self._stage(positions, velocities, self.vt, self.at, dt, 1.)
+
+        self.dx *= dt/6.
+        positions += self.dx
+        self.dv *= dt/6.
+        velocities += self.dv
+
+        self.system.accelerations(positions, out=acc)
+
+
+STEPPERS = {"verlet": VerletStepper, "leapfrog": VerletStepper,
+            "yoshida": YoshidaStepper, "forestruth": YoshidaStepper,
+            "rk4": RK4Stepper}
+
+
+def _check_every(nsteps, every):
+    # make sure the outputs include the final state
+    if every < 1 or nsteps % every != 0:
+        raise ValueError("nsteps (%d) must be a multiple of every (%d)" % (nsteps, every))
+
+
+class Integrator(object):
+    """
+    Evolve an N-body system with a fixed time step.
+
+    Args:
+        system (NBody): the N-body system
+        stepper (str): the name of the stepper in STEPPERS, or a stepper
+            instance (with setup and step methods, see VerletStepper)
+    """
+
+    def __init__(self, system, stepper="verlet"):
+        self.system = system
+
+        if isinstance(stepper, str):
+            try:
+                stepper = STEPPERS[stepper.lower()]()
+            except KeyError:
+                raise ValueError("Unknown stepper '%s', must be one of %s" % (stepper, sorted(STEPPERS)))
+
+        self.stepper = stepper
+
+    def iterate(self, positions, velocities, dt, nsteps, every=1):
+        """
+        Evolve the system for nsteps time steps of size dt, yielding the
+        output index and the current positions and velocities every few
+        steps (starting with the initial values). The yielded arrays are
+        updated in place as the system evolves.
+
+        Args:
+            positions (array): an (n_bodies x 3) array of initial positions
+                (or an array with extra leading dimensions)
+            velocities (array): an (n_bodies x 3) array of initial velocities
+            dt (float): the time step
+            nsteps (int): the number of time steps
+            every (int): output every this many steps (nsteps must be a
+                multiple of this)
+        """
+
+        _check_every(nsteps, every)
+
+        pos = np.array(positions, dtype=float)
+        vel = np.array(velocities, dtype=float)
+        acc = self.system.accelerations(pos).copy()
+
+        self.stepper.setup(self.system, pos)
+
+        yield 0, pos, vel
+
+        for i in range(1, nsteps//every + 1):
+            for j in range(every):
+                self.stepper.step(pos, vel, acc, dt)
+
+            yield i, pos, vel
+
+    def run(self, positions, velocities, dt, nsteps, every=1):
+        """
+        Evolve the system for nsteps time steps of size dt, recording the
+        positions, velocities and energies every few steps. This returns
+        the recorded times and (n_out x n_bodies x 3) positions and
+        velocities. The energies and the maximum fractional energy drift are
+        stored in the energies and energy_drift attributes.
+
+        Args:
+            positions (array): an (n_bodies x 3) array of initial positions
+                (or an array with extra leading dimensions)
+            velocities (array): an (n_bodies x 3) array of initial velocities
+            dt (float): the time step
+            nsteps (int): the number of time steps
+            every (int): record the output every this many steps (nsteps
+                must be a multiple of this)
+        """
+
+        _check_every(nsteps, every)
+
+        positions = np.asarray(positions)
+
+        nout = nsteps//every + 1
+        self.times = dt*every*np.arange(nout)
+        self.positions = np.empty((nout,) + positions.shape)
+        self.velocities = np.empty((nout,) + positions.shape)
+        self.energies = np.empty((nout,) + positions.shape[:-2])
+
+        for i, pos, vel in self.iterate(positions, velocities, dt, nsteps, every=every):
+            self.positions[i] = pos
+            self.velocities[i] = vel
+            self.energies[i] = self.system.energy(pos, vel)
+
+        self.energy_drift = np.max(np.abs(self.energies - self.energies[0])/np.abs(self.energies[0]), axis=0)
+
+        return self.times, self.positions, self.velocities
+
+
+class RunningStatistics(object):
+    """
+    The running mean, variance, minimum and maximum over an ensemble of
+    arrays with shape (n_out,) + shape, updated with batches of ensemble
+    members at a time, so the full ensemble is never stored.
+
+    Args:
+        shape (tuple): the shape of the (n_out,) + shape arrays
+    """
+
+    def __init__(self, shape):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)  # sum of squared differences from the mean
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+
+    def _combine(self, index, count, mean, m2, mn, mx):
+        # combine statistics (e.g. Chan et al, 1979)
+        total = self.count + count
+        delta = mean - self.mean[index]
+        self.mean[index] += delta*(count/total)
+        self.m2[index] += m2 + delta**2*(self.count*count/total)
+        np.minimum(self.min[index], mn, out=self.min[index])
+        np.maximum(self.max[index], mx, out=self.max[index])
+
+    def update(self, index, batch):
+        """
+        Update the statistics at output index with a batch (n_members x
+        shape) of ensemble members. Note that the count is only incremented
+        by :meth:`finish_batch`, once all output indices have been updated.
+        """
+
+        mean = batch.mean(axis=0)
+        m2 = np.sum((batch - mean)**2, axis=0)
+        self._combine(index, len(batch), mean, m2, batch.min(axis=0), batch.max(axis=0))
+        self._batchcount = len(batch)
+
+    def finish_batch(self):
+        self.count += self._batchcount
+
+    def merge(self, other):
+        """Merge in the statistics from another RunningStatistics"""
+        if self.count == 0:
+            self.count, self.mean, self.m2, self.min, self.max = other.count, other.mean, other.m2, other.min, other.max
+        elif other.count > 0:
+            self._combine(Ellipsis, other.count, other.mean, other.m2, other.min, other.max)
+            self.count += other.count
+
+    @property
+    def variance(self):
+        return self.m2/max(self.count - 1, 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+def _integrate_block(masses, states, dt, nsteps, stepper, every):
+    """
+    Integrate a block of ensemble members, returning the running statistics
+    of their states and their maximum fractional energy drifts.
+    """
+
+    system = NBody(masses)
+    integrator = Integrator(system, stepper=stepper)
+    pos, vel = states[..., :3], states[..., 3:]
+
+    stats = RunningStatistics((nsteps//every + 1,) + states.shape[1:])
+    statebuf = np.empty(states.shape)
+
+    for i, pos, vel in integrator.iterate(pos, vel, dt, nsteps, every=every):
+        energy = system.energy(pos, vel)
+        if i == 0:
+            energy0 = energy
+            drift = np.zeros_like(energy)
+        np.maximum(drift, np.abs((energy - energy0)/energy0), out=drift)
+
+        statebuf[..., :3] = pos
+        statebuf[..., 3:] = vel
+        stats.update(i, statebuf)
+
+    stats.finish_batch()
+
+    return stats, drift
+
+
+def integrate_ensemble(states, masses, dt, nsteps, stepper="verlet", every=1, nprocs=None, blocksize=None):
+    """
+    Integrate an ensemble of (e.g. perturbed) N-body systems with a fixed
+    time step, with all members in a block being evolved together. The
+    ensemble can be split into blocks that are evolved in parallel. Only
+    summary statistics of the states are kept, rather than the full ensemble
+    history. This returns the output times, a RunningStatistics object
+    containing the mean, std, min and max of the (n_out x n_bodies x 6)
+    states over the ensemble, and the maximum fractional energy drift of
+    each ensemble member.
+
+    Args:
+        states (array): an (n_ensemble x n_bodies x 6) array of initial
+            positions and velocities (or n_ensemble x 6n_bodies state
+            vectors as used for odeint)
+        masses (array): the masses multiplied by G of each body, either the
+            same for all ensemble members (n_bodies) or different for each
+            (n_ensemble x n_bodies)
+        dt (float): the time step
+        nsteps (int): the number of time steps
+        stepper (str): the name of the stepper in STEPPERS
+        every (int): output statistics every this many steps (nsteps must
+            be a multiple of this)
+        nprocs (int): the number of parallel processes (the default of None
+            evolves all blocks in the current process)
+        blocksize (int): the number of ensemble members in each block
+            (defaults to splitting the ensemble evenly between processes)
+    """
+
+    _check_every(nsteps, every)
+
+    masses = np.asarray(masses, dtype=float)
+    states = np.asarray(states, dtype=float)
+    states = states.reshape(states.shape[:1] + (masses.shape[-1], 6))
+    nens = len(states)
+
+    if blocksize is None:
+        blocksize = int(np.ceil(nens/(nprocs or 1)))
+
+    blocks = []
+    for start in range(0, nens, blocksize):
+        stop = min(start + blocksize, nens)
+        blockmasses = masses if masses.ndim == 1 else masses[start:stop]
+        blocks.append((blockmasses, states[start:stop], dt, nsteps, stepper, every))
+
+    if nprocs is None or nprocs == 1:
+        results = [_integrate_block(*block) for block in blocks]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=nprocs) as executor:
+            results = list(executor.map(_integrate_block, *zip(*blocks)))
+
+    stats = RunningStatistics(results[0][0].mean.shape)
+    for blockstats, drift in results:
+        stats.merge(blockstats)
+
+    times = dt*every*np.arange(nsteps//every + 1)
+    drift = np.concatenate([drift for blockstats, drift in results])
+
+    return times, stats, drift
@@ -0,0 +1,221 @@
+"""
+A faster likelihood for fitting (non-linear) timing model parameters, such
+as F0 and F1 in test_pulsar.py.
+
+With ``tm_linear=False, tm_var=True`` the timing model delay is recalculated
+by the full (tempo2/libstempo) timing model for every likelihood evaluation.
+Here the delay is instead approximated by a second-order Taylor expansion
+about a reference point,
+
+  d(x) ~ d(x0) + J (x - x0) + (x - x0)^T H (x - x0)/2,
+
+where J is the design matrix (the derivatives of the delay for each TOA
+with respect to the timing parameters x) and H are the second derivatives,
+both found with finite differences of the full timing model. This is
+accurate to second order in the parameter offsets. The full model is only
+re-evaluated (and the expansion re-centred) when a sample falls outside a
+trust region around the reference point, e.g.
+
+>>> likelihood = TaylorTimingLikelihood(pta, parameters)
+
+in place of ``bilby_warp.PTABilbyLikelihood(pta, parameters)``.
+"""
+
+import numpy as np
+
+from enterprise_warp import bilby_warp
+
+
+class QuadraticDelayModel:
+    """
+    A second-order Taylor expansion of a delay function.
+
+    Args:
+        delay (callable): the full delay function, called with a parameter
+            vector x, returning an array of delays for each TOA
+        steps (array): the finite difference step size for each parameter
+        trust_radius (float): the maximum offset of any parameter (in units
+            of its step size) from the reference point before the expansion
+            is re-calculated at the new point
+    """
+
+    def __init__(self, delay, steps, trust_radius=100.):
+        self.delay = delay
+        self.steps = np.atleast_1d(np.asarray(steps, dtype=float))
+        self.trust_radius = trust_radius
+
+        self.x0 = None
+        self.nrefresh = 0  # number of times the expansion has been calculated
+        self.ncalls = 0
+
+    def refresh(self, x0):
+        """
+        Calculate the expansion about x0 (requiring 1 + 2n + 4n(n-1)/2 full
+        delay evaluations for n parameters).
+        """
+
+        x0 = np.array(x0, dtype=float)
+        n = len(x0)
+        h = self.steps
+
+        def shifted(*shifts):
+            x = x0.copy()
+            for i, s in shifts:
+                x[i] += s * h[i]
+            return np.asarray(self.delay(x), dtype=float)
+
+        d0 = shifted()
+        self.J = np.empty((len(d0), n))
+        self.H = np.empty((len(d0), n, n))
+
+        for i in range(n):
+            dp = shifted((i, 1))
+            dm = shifted((i, -1))
+            self.J[:, i] = (dp - dm) / (2 * h[i])
+            self.H[:, i, i] = (dp - 2 * d0 + dm) / h[i] ** 2
+
+            for j in range(i):
+                self.H[:, i, j] = self.H[:, j, i] = (
+                    shifted((i, 1), (j, 1))
+                    - shifted((i, 1), (j, -1))
+                    - shifted((i, -1), (j, 1))
+                    + shifted((i, -1), (j, -1))
+                ) / (4 * h[i] * h[j])
+
+        self.x0 = x0
+        self.d0 = d0
+        self.nrefresh += 1
+
+    def in_trust_region(self, x):
+        return self.x0 is not None and np.all(np.abs(x - self.x0) <= self.trust_radius * self.steps)
+
+    def __call__(self, x):
+        """
+        Get the (approximate) delay for parameters x.
+        """
+
+        x = np.asarray(x, dtype=float)
+        self.ncalls += 1
+
+        if not self.in_trust_region(x):
+            self.refresh(x)
+            return self.d0.copy()
+
+        return self.approximate(x)
+
+    def approximate(self, x):
+        """
+        Get the approximate delay for parameters x from the current expansion.
+        """
+
+        dx = np.asarray(x, dtype=float) - self.x0
+        return self.d0 + self.J @ dx + 0.5 * np.einsum("tij,i,j->t", self.H, dx, dx)
+
+    def max_error(self, x):
+        """
+        Get the maximum absolute difference between the approximate and full
+        delays at x (without re-calculating the expansion).
+        """
+
+        return np.max(np.abs(self.approximate(x) - self.delay(x)))
+
+
+class TimingDelay:
+    """
+    A replacement for the get_delay method of an enterprise timing model
+    signal, using a QuadraticDelayModel of its delay as a function of the
+    timing model parameters.
+
+    Args:
+        get_delay (callable): the original (full) get_delay method
+        name (str): the name of the timing model (vector) parameter
+        size (int): the number of timing model parameters
+        steps (array): the finite difference step size for each parameter
+        trust_radius (float): the trust region size (see QuadraticDelayModel)
+    """
+
+    def __init__(self, get_delay, name, size, steps, trust_radius=100.):
+        self.get_delay = get_delay
+        self.name = name
+        self.size = size
+        self.model = QuadraticDelayModel(self.full_delay, steps, trust_radius=trust_radius)
+        self.params = {}
+
+    def get_vector(self, params):
+        """
+        Get the timing model parameters from a parameter dictionary, where
+        they are either given as an array or as separate "name_0", "name_1",
+        ... values.
+        """
+
+        if self.name in params:
+            return np.atleast_1d(params[self.name]).astype(float)
+        return np.array([params[f"{self.name}_{i}"] for i in range(self.size)], dtype=float)
+
+    def full_delay(self, x):
+        """
+        The full timing model delay for timing model parameters x (with any
+        other parameters taken from the latest call).
+        """
+
+        params = dict(self.params)
+        if self.name in params:
+            params[self.name] = x
+        else:
+            params.update({f"{self.name}_{i}": value for i, value in enumerate(x)})
+
+        return self.get_delay(params)
+
+    def __call__(self, params):
+        self.params = params
+        return self.model(self.get_vector(params))
+
+
+class TaylorTimingLikelihood(bilby_warp.PTABilbyLikelihood):
+    """
+    A bilby likelihood for an enterprise PTA, in which the delays from the
+    (non-linear) timing model signals are given by a QuadraticDelayModel.
+    The other (noise) parts of the likelihood are calculated as normal.
+
+    Args:
+        pta: the enterprise PTA (e.g. from model_singlepsr_noise with
+            tm_linear=False and tm_var=True)
+        parameters (dict): the bilby parameters dictionary
+        trust_radius (float): the trust region size (see
+            QuadraticDelayModel). The timing model parameters are offsets in
+            units of the par file uncertainties, so with the default step
+            size of 0.1 the default trust region is +/-10 sigma.
+        step (float): the finite difference step size for the timing model
+            parameters
+        tmname (str): the name (or part of the name) of the timing model
+            parameters
+    """
+
+    def __init__(self, pta, parameters, trust_radius=100., step=0.1, tmname="tmparams"):
+        super().__init__(pta, parameters)
+
+        self.delays = []
+
+        for sc in pta._signalcollections:
+            for signal in sc._signals:
+                if getattr(signal, "signal_type", None) != "deterministic":
+                    continue
+
+                tmparams = [p for p in signal.params if tmname in p.name]
+                if len(tmparams) == 0:
+                    continue
+
+                size = tmparams[0].size or 1
+                delay = TimingDelay(
+                    signal.get_delay, tmparams[0].name, size, [step] * size, trust_radius=trust_radius
+                )
+                signal.get_delay = delay
+                self.delays.append(delay)
+
+        if len(self.delays) == 0:
+            raise ValueError(f"No deterministic signals with '{tmname}' parameters found")
+
+    @property
+    def nrefresh(self):
+        """The number of times the full timing model expansions have been calculated"""
+        return sum(delay.model.nrefresh for delay in self.delays)
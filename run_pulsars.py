@@ -0,0 +1,275 @@
+"""
+Fit the F0 and F1 parameters (and white noise) of many pulsars, in the same
+way as test_pulsar.py, with the pulsars being run in parallel, e.g.
+
+  python run_pulsars.py J0030+0451.par:J0030+0451.tim J1012+5307.par:J1012+5307.tim \\
+      --backend L-wide_PUPPI --nprocs 8 --cores-per-pulsar 2
+
+or with a file containing a "parfile timfile" pair on each line:
+
+  python run_pulsars.py --pulsar-list pulsars.txt
+
+The TOAs in each .tim file (and any files it INCLUDEs) are filtered to those
+from the given backend, and the filtered TOAs are written to a single .tim
+file in cachedir, named by the SHA256 hash of the .par file, the filtered
+TOAs and the backend. tempo2 (through enterprise and libstempo) then reads
+this file, so it only parses the TOAs that are used, but it still does so for
+every fit, as the (non-linear) timing model needs it. A summary table of the
+F0 and F1 posteriors and the wall time for each pulsar is written to
+summary.csv in the output directory.
+"""
+
+import argparse
+import csv
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+# environment variables setting the number of threads used by numerical libraries
+THREAD_VARIABLES = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"]
+
+
+def file_hash(*filenames, extra=""):
+    """
+    The SHA256 hash of the contents of a set of files (and an extra string or
+    bytes).
+    """
+
+    h = hashlib.sha256()
+    for filename in filenames:
+        with open(filename, "rb") as fp:
+            for block in iter(lambda: fp.read(2 ** 20), b""):
+                h.update(block)
+    h.update(extra if isinstance(extra, bytes) else extra.encode())
+    return h.hexdigest()
+
+
+def filter_tim(content, backend=None):
+    """
+    Get the lines of a .tim file containing the given backend flag value (and
+    any lines starting with "C", "M" or "F", e.g., comments, MODE and FORMAT
+    lines). If backend is None all lines are returned.
+    """
+
+    lines = content.splitlines(keepends=True)
+    if backend is None:
+        return lines
+
+    flag = backend.encode() if isinstance(content, bytes) else backend
+    keep = (b"C", b"M", b"F") if isinstance(content, bytes) else ("C", "M", "F")
+    return [line for line in lines if line.startswith(keep) or flag in line]
+
+
+def read_tim(timfile, backend=None):
+    """
+    Get the lines of a .tim file filtered to the given backend (see
+    filter_tim), with any INCLUDE lines replaced by the (filtered) lines of
+    the included files. Relative INCLUDE paths are taken to be relative to
+    the directory of the file including them.
+    """
+
+    with open(timfile, "rb") as fp:
+        content = fp.read()
+
+    lines = []
+    for line in content.splitlines(keepends=True):
+        words = line.split()
+        if len(words) > 1 and words[0].upper() == b"INCLUDE":
+            included = read_tim(os.path.join(os.path.dirname(timfile), words[1].decode()), backend)
+            if len(included) > 0 and not included[-1].endswith(b"\n"):
+                included[-1] += b"\n"
+            lines.extend(included)
+        else:
+            lines.extend(filter_tim(line, backend))
+
+    return lines
+
+
+def cached_tim(parfile, timfile, backend=None, cachedir="toacache"):
+    """
+    Get the path to the cached (backend filtered) .tim file for a pulsar,
+    creating it if it does not exist.
+    """
+
+    lines = read_tim(timfile, backend)
+
+    key = file_hash(parfile, extra=b"".join(lines) + str(backend).encode())
+    cachedtim = os.path.join(cachedir, f"{key}.tim")
+
+    if not os.path.isfile(cachedtim):
+        os.makedirs(cachedir, exist_ok=True)
+
+        # write to a temporary file first so incomplete files are never used
+        tmp = cachedtim + f".tmp{os.getpid()}"
+        with open(tmp, "wb") as fp:
+            fp.writelines(lines)
+        os.replace(tmp, cachedtim)
+
+    return cachedtim
+
+
+def fit_pulsar(parfile, timfile, backend=None, cachedir="toacache", outdir="results", nsamples=1000, cores=1):
+    """
+    Fit a pulsar's F0 and F1 parameters and white noise with bilby_mcmc (as
+    in test_pulsar.py), returning a dictionary summarising the F0 and F1
+    posteriors.
+    """
+
+    start = time.time()
+
+    from enterprise.pulsar import Pulsar
+    from enterprise_extensions.models import model_singlepsr_noise
+
+    import bilby
+    from enterprise_warp import bilby_warp
+
+    from pulsar_likelihood import TaylorTimingLikelihood
+
+    psr = Pulsar(parfile, cached_tim(parfile, timfile, backend=backend, cachedir=cachedir), drop_t2pulsar=False)
+
+    plist = ["F0", "F1"]  # vary F0 and F1
+
+    pta = model_singlepsr_noise(
+        psr,
+        tmparam_list=plist,
+        tm_linear=False,
+        tm_var=True,
+        components=1,
+        tm_marg=False,
+        red_var=False,
+        white_vary=True,
+    )
+
+    priors = bilby_warp.get_bilby_prior_dict(pta)
+    parameters = dict.fromkeys(priors.keys())
+    likelihood = TaylorTimingLikelihood(pta, parameters)
+
+    label = psr.name
+    res = bilby.run_sampler(
+        likelihood=likelihood,
+        priors=priors,
+        outdir=os.path.join(outdir, psr.name),
+        label=label,
+        sampler="bilby_mcmc",
+        nsamples=nsamples,
+        npool=cores,
+    )
+
+    summary = {"pulsar": psr.name, "ntoas": len(psr.toas)}
+
+    # convert F0 and F1 into true values
+    for i, p in enumerate(plist):
+        samples = psr.t2pulsar[p].val + psr.t2pulsar[p].err * np.asarray(
+            res.posterior[f"{psr.name}_timing model_tmparams_{i}"], dtype=np.longdouble
+        )
+        summary[f"{p}_median"] = np.median(samples)
+        summary[f"{p}_std"] = np.std(samples)
+        summary[f"{p}_5%"], summary[f"{p}_95%"] = np.percentile(samples, [5, 95])
+
+    summary["wall_time"] = time.time() - start
+
+    return summary
+
+
+def _run(args):
+    # run fit_pulsar catching (and returning) any errors
+    parfile, timfile, kwargs = args
+    start = time.time()
+    try:
+        summary = fit_pulsar(parfile, timfile, **kwargs)
+        summary["status"] = "ok"
+    except Exception as e:
+        summary = {
+            "pulsar": os.path.splitext(os.path.basename(parfile))[0],
+            "wall_time": time.time() - start,
+            "status": f"failed: {e}",
+        }
+
+    summary["parfile"] = parfile
+    summary["timfile"] = timfile
+    return summary
+
+
+SUMMARY_COLUMNS = [
+    "pulsar", "status", "ntoas",
+    "F0_median", "F0_std", "F0_5%", "F0_95%",
+    "F1_median", "F1_std", "F1_5%", "F1_95%",
+    "wall_time", "parfile", "timfile",
+]
+
+
+def write_summary(filename, summaries):
+    """
+    Write the summary table for a set of pulsars as a CSV file.
+    """
+
+    with open(filename, "w", newline="") as fp:
+        writer = csv.DictWriter(fp, fieldnames=SUMMARY_COLUMNS, restval="")
+        writer.writeheader()
+        for summary in summaries:
+            # use str so that long double values are written at full precision
+            writer.writerow({key: (str(value) if isinstance(value, np.floating) else value) for key, value in summary.items()})
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("pulsars", nargs="*", help="parfile:timfile pairs")
+    parser.add_argument("--pulsar-list", help="file with a 'parfile timfile' pair on each line")
+    parser.add_argument("--backend", default=None, help="only use TOAs from this backend, e.g., L-wide_PUPPI")
+    parser.add_argument("--cachedir", default="toacache", help="TOA cache directory [%(default)s]")
+    parser.add_argument("--outdir", default="results", help="output directory [%(default)s]")
+    parser.add_argument("--nsamples", type=int, default=1000, help="number of posterior samples [%(default)s]")
+    parser.add_argument("--nprocs", type=int, default=os.cpu_count(), help="total number of cores to use [%(default)s]")
+    parser.add_argument("--cores-per-pulsar", type=int, default=1, help="number of cores for each pulsar [%(default)s]")
+
+    args = parser.parse_args(args)
+
+    pairs = [tuple(pulsar.split(":")) for pulsar in args.pulsars]
+    if args.pulsar_list is not None:
+        with open(args.pulsar_list, "r") as fp:
+            pairs.extend(tuple(line.split()[:2]) for line in fp if line.strip() and not line.startswith("#"))
+
+    if len(pairs) == 0:
+        parser.error("No pulsars given")
+
+    # limit the number of threads each pulsar's process uses
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(args.cores_per_pulsar)
+
+    kwargs = {
+        "backend": args.backend,
+        "cachedir": args.cachedir,
+        "outdir": args.outdir,
+        "nsamples": args.nsamples,
+        "cores": args.cores_per_pulsar,
+    }
+
+    nworkers = max(args.nprocs // args.cores_per_pulsar, 1)
+
+    # start new (rather than forked) worker processes, so that numpy is
+    # imported in each with the thread limits above already set
+    context = multiprocessing.get_context("spawn")
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=nworkers, mp_context=context) as executor:
+        summaries = list(executor.map(_run, [(par, tim, kwargs) for par, tim in pairs]))
+
+    os.makedirs(args.outdir, exist_ok=True)
+    summaryfile = os.path.join(args.outdir, "summary.csv")
+    write_summary(summaryfile, summaries)
+
+    nfailed = sum(1 for summary in summaries if summary["status"] != "ok")
+    print(f"Fitted {len(summaries) - nfailed} of {len(summaries)} pulsars in {time.time() - start:.1f} s (summary in {summaryfile})")
+
+    return summaries
+
+
+if __name__ == "__main__":
+    main()
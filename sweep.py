@@ -0,0 +1,267 @@
+"""
+Run a sweep of (external) commands in parallel, e.g., the
+lalapps_pulsar_parameter_estimation and
+lalapps_pulsar_parameter_estimation_nested runs in
+SimulatedSignalTestsSNRvsEvidence.ipynb:
+
+>>> tasks = [Task("grid_0", ["lalapps_pulsar_parameter_estimation", ...], files={"pulsar.par": pardata})]
+>>> sweep = Sweep("sweep", nworkers=4)
+>>> records = sweep.run(tasks)
+
+Each task is run in its own working directory (rundir/<task name>), into
+which any input files it needs are written first, so tasks that use the same
+input and output file names can run at the same time. The stdout and stderr
+of each task are written to files in its working directory, and the exit
+code and timings of each task are appended to a record file (as JSON lines),
+along with a hash of its command and input files. When a sweep is restarted,
+tasks that have previously completed successfully with the same command and
+input file contents are skipped and their previous records are returned, while
+any with changed inputs (e.g., newly generated data) are run again.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Task(object):
+    """
+    A command to be run as part of a sweep.
+
+    Args:
+        name (str): a unique name for the task (used as the name of its
+            working directory)
+        command (list): the command and its arguments, run in the task's
+            working directory (without a shell)
+        files (dict): input files to create in the working directory, keyed
+            on their (relative) paths, with values giving the file contents
+            (str or bytes) or functions that are called with the path to
+            write the file
+        directories (list): any other (e.g., output) directories to create
+            in the working directory
+        env (dict): extra environment variables for the command
+        timeout (float): the maximum time (s) to let the command run for
+    """
+
+    def __init__(self, name, command, files=None, directories=None, env=None, timeout=None):
+        if os.path.basename(name) != name or name in ("", ".", ".."):
+            raise ValueError("Task name '{}' is not a valid directory name".format(name))
+
+        self.name = name
+        self.command = [str(arg) for arg in command]
+        self.files = {} if files is None else files
+        self.directories = [] if directories is None else directories
+
+        # input files and directories must be within the working directory
+        for path in list(self.files) + list(self.directories):
+            if os.path.isabs(path) or os.path.normpath(path).split(os.sep)[0] in ("", ".", ".."):
+                raise ValueError("Path '{}' is not a relative path within the working directory".format(path))
+
+        self.env = env
+        self.timeout = timeout
+
+    def setup(self, workdir):
+        """
+        Create the (empty) working directory and write the input files.
+        """
+
+        # remove anything left from previous (failed) attempts
+        if os.path.isdir(workdir):
+            shutil.rmtree(workdir)
+        os.makedirs(workdir)
+
+        for directory in self.directories:
+            os.makedirs(os.path.join(workdir, directory), exist_ok=True)
+
+        for filename, content in self.files.items():
+            path = os.path.join(workdir, filename)
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            if callable(content):
+                content(path)
+            else:
+                with open(path, "wb" if isinstance(content, bytes) else "w") as fp:
+                    fp.write(content)
+
+    def hash(self, workdir):
+        """
+        The SHA256 hash of the task's command, environment, directories and
+        the contents of its input files (as written to workdir by setup).
+        """
+
+        h = hashlib.sha256()
+        h.update(json.dumps([self.command, self.env, sorted(self.directories)], sort_keys=True, default=str).encode())
+
+        for filename in sorted(self.files):
+            path = os.path.join(workdir, filename)
+            h.update("\0{}\0{}\0".format(filename, os.path.getsize(path)).encode())
+            with open(path, "rb") as fp:
+                for block in iter(lambda: fp.read(2 ** 20), b""):
+                    h.update(block)
+
+        return h.hexdigest()
+
+
+class Sweep(object):
+    """
+    Run a set of tasks in parallel, each in its own working directory.
+
+    Args:
+        rundir (str): the directory in which to create the task working
+            directories
+        nworkers (int): the maximum number of tasks to run at once
+            (defaults to the number of CPUs)
+        recordfile (str): the file to record the task exit codes and timings
+            in (defaults to rundir/records.jsonl)
+    """
+
+    def __init__(self, rundir, nworkers=None, recordfile=None):
+        self.rundir = rundir
+        self.nworkers = os.cpu_count() if nworkers is None else nworkers
+        self.recordfile = os.path.join(rundir, "records.jsonl") if recordfile is None else recordfile
+        self._lock = threading.Lock()
+
+    def workdir(self, name):
+        """The working directory for a task"""
+        return os.path.join(self.rundir, name)
+
+    def records(self):
+        """
+        Get the latest record for each task in the record file, keyed on the
+        task names.
+        """
+
+        records = {}
+        if not os.path.isfile(self.recordfile):
+            return records
+
+        with open(self.recordfile, "r") as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # ignore any partially written record, e.g., if a previous sweep was killed
+                    continue
+                records[record["name"]] = record
+
+        return records
+
+    def completed(self):
+        """The names of the tasks that have completed successfully"""
+        return set(name for name, record in self.records().items() if record["returncode"] == 0)
+
+    def _record(self, record):
+        with self._lock:
+            with open(self.recordfile, "ab+") as fp:
+                # start a new line after any partially written record
+                if fp.seek(0, os.SEEK_END) > 0:
+                    fp.seek(-1, os.SEEK_END)
+                    if fp.read(1) != b"\n":
+                        fp.write(b"\n")
+
+                fp.write((json.dumps(record) + "\n").encode())
+                fp.flush()
+                os.fsync(fp.fileno())
+
+    def run_task(self, task, previous=None):
+        """
+        Run a single task, returning (and recording) its record. If the
+        task's previous record is given, and it completed successfully with
+        the same command and input files, it is not run again and the
+        previous record is returned.
+        """
+
+        workdir = self.workdir(task.name)
+
+        # write the input files to a separate directory first, so the previous
+        # outputs are kept if the task does not need to be run again
+        setupdir = os.path.join(self.rundir, ".setup", task.name)
+
+        env = None
+        if task.env is not None:
+            env = dict(os.environ)
+            env.update(task.env)
+
+        record = {"name": task.name, "command": task.command, "workdir": workdir, "start": time.time()}
+
+        try:
+            task.setup(setupdir)
+            record["hash"] = task.hash(setupdir)
+        except Exception as e:
+            # record the failure rather than stopping the rest of the sweep
+            shutil.rmtree(setupdir, ignore_errors=True)
+            record["returncode"] = None
+            record["error"] = "setup failed: {}".format(e)
+        else:
+            if previous is not None and previous["returncode"] == 0 and previous.get("hash") == record["hash"]:
+                shutil.rmtree(setupdir)
+                return previous
+
+            if os.path.isdir(workdir):
+                shutil.rmtree(workdir)
+            os.replace(setupdir, workdir)
+
+            with open(os.path.join(workdir, "stdout"), "wb") as out, open(os.path.join(workdir, "stderr"), "wb") as err:
+                try:
+                    p = subprocess.run(
+                        task.command, cwd=workdir, stdout=out, stderr=err, env=env, timeout=task.timeout
+                    )
+                    record["returncode"] = p.returncode
+                except subprocess.TimeoutExpired:
+                    record["returncode"] = None
+                    record["error"] = "timed out after {} s".format(task.timeout)
+                except OSError as e:
+                    # e.g., the executable does not exist
+                    record["returncode"] = None
+                    record["error"] = str(e)
+
+        record["end"] = time.time()
+        record["walltime"] = record["end"] - record["start"]
+
+        self._record(record)
+
+        return record
+
+    def run(self, tasks, verbose=True):
+        """
+        Run a set of tasks (skipping any that have already completed
+        successfully with the same command and input files), returning a
+        list of the record for each task.
+        """
+
+        tasks = list(tasks)
+        names = [task.name for task in tasks]
+        if len(set(names)) != len(names):
+            raise ValueError("Task names must be unique")
+
+        os.makedirs(self.rundir, exist_ok=True)
+
+        previous = self.records()
+        completed = self.completed()
+
+        if verbose:
+            print("Running {} tasks ({} previously completed) with {} workers".format(
+                len(tasks), len(completed.intersection(names)), self.nworkers
+            ))
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.nworkers) as executor:
+            records = list(executor.map(lambda task: self.run_task(task, previous.get(task.name)), tasks))
+
+        shutil.rmtree(os.path.join(self.rundir, ".setup"), ignore_errors=True)
+
+        if verbose:
+            ran = [record for record in records if record is not previous.get(record["name"])]
+            failed = [record["name"] for record in ran if record["returncode"] != 0]
+            print("Ran {} tasks in {:.1f} s ({} unchanged and skipped, {} failed{})".format(
+                len(ran), time.time() - start, len(tasks) - len(ran), len(failed),
+                ": " + ", ".join(failed) if failed else ""
+            ))
+
+        return records
@@ -20,6 +20,8 @@ with open(newfile, "w") as fp:
        if line[0] in ["C", "M", "F"] or "L-wide_PUPPI" in line:
            fp.write(line)
 ```
+
+See run_pulsars.py for running this fit (with the above filtering) for many pulsars in parallel.
 """
 
 import os
@@ -36,6 +38,8 @@ from bilby.core.result import read_in_result
 
 from enterprise_warp import bilby_warp
 
+from pulsar_likelihood import TaylorTimingLikelihood
+
 # use the tim files from wn_sp_tutorial - tim files within the -pta flag
 # do not seem to work with model_singlepsr_noise
 parfile = "J0030+0451_NANOGrav_12yv3.gls.par"
@@ -59,7 +63,10 @@ pta = model_singlepsr_noise(
 # run using enterprise_warp to access bilby_mcmc
 priors = bilby_warp.get_bilby_prior_dict(pta)
 parameters = dict.fromkeys(priors.keys())
-likelihood = bilby_warp.PTABilbyLikelihood(pta, parameters)
+
+# use a second-order Taylor expansion of the F0/F1 timing model delay rather
+# than re-evaluating the full timing model for every sample
+likelihood = TaylorTimingLikelihood(pta, parameters)
 
 outdir = "test/"
 label = "test_bilby"
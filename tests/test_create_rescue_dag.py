@@ -0,0 +1,22 @@
+"""
+Tests of create_rescue_dag.py.
+"""
+
+import os
+
+from create_rescue_dag import collect_dags
+
+
+def test_collect_dags(tmp_path, monkeypatch):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "mydag.dag").write_text(
+        "JOB a a.sub\nSUBDAG EXTERNAL s sub/s.dag\nSUBDAG EXTERNAL t ../{}/mydag.dag\n".format(tmp_path.name)
+    )
+    (tmp_path / "sub" / "s.dag").write_text("JOB b b.sub\nSUBDAG EXTERNAL u ../mydag.dag\n")
+    os.symlink("mydag.dag", str(tmp_path / "link.dag"))
+
+    monkeypatch.chdir(tmp_path)
+
+    # each DAG is only included once, however it is reached
+    assert collect_dags(["mydag.dag", "./mydag.dag", "link.dag"]) == ["mydag.dag", os.path.join("sub", "s.dag")]
+    assert collect_dags(["./mydag.dag", "mydag.dag"], subdags=False) == ["./mydag.dag"]
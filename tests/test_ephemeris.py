@@ -0,0 +1,116 @@
+"""
+Tests of ephemeris.py, run offline against the stored JPL format file in
+tests/data.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from ephemeris import BASEURL, EphemerisCache, load_ephemeris, load_ephemerides, parse_ephemeris
+
+
+DATADIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def read_fixture(filename="sun.txt"):
+    with open(os.path.join(DATADIR, filename), "rb") as fp:
+        return fp.read()
+
+
+@pytest.fixture(autouse=True)
+def no_network(monkeypatch):
+    # make sure nothing is downloaded and no default directories are used
+    monkeypatch.setitem(sys.modules, "requests", None)
+    monkeypatch.delenv("SOLSYM_DATA", raising=False)
+    monkeypatch.delenv("SOLSYM_CACHE", raising=False)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EphemerisCache(str(tmp_path / "cache"))
+
+
+def test_parse_ephemeris():
+    table = parse_ephemeris(read_fixture())
+
+    assert table.shape == (3, 7)
+    assert np.allclose(table[:, 0], [2458119.5, 2458120.5, 2458121.5])
+    assert table[0, 1] == 3.118634503405621e-03
+    assert table[2, 6] == 1.235162005113208e-07
+
+    # str and bytes contents give the same table
+    assert np.array_equal(parse_ephemeris(read_fixture().decode()), table)
+
+
+def test_parse_ephemeris_no_table():
+    with pytest.raises(ValueError):
+        parse_ephemeris(b"no ephemeris here")
+
+
+def test_cache_store_and_load(cache):
+    content = read_fixture()
+    key = cache.store(content)
+
+    assert key == EphemerisCache.key(content)
+    assert key in cache
+    assert os.path.isfile(cache.path(key))
+
+    # storing the same content again does not rewrite it
+    mtime = os.path.getmtime(cache.path(key))
+    assert cache.store(content) == key
+    assert os.path.getmtime(cache.path(key)) == mtime
+
+    # reloaded tables are memory-mapped, with the same values as parsing the file
+    table = cache.load(key)
+    assert isinstance(table, np.memmap)
+    assert np.array_equal(table, parse_ephemeris(content))
+
+
+def test_cache_index_lookup(cache):
+    url = BASEURL.format("sun.txt")
+    assert cache.lookup(url) is None
+
+    key = cache.store(read_fixture())
+    cache.add_to_index(url, key)
+
+    assert cache.lookup(url) == key
+    assert EphemerisCache(cache.cachedir).lookup(url) == key
+
+    # an index entry for a table that is no longer cached is ignored
+    os.remove(cache.path(key))
+    assert cache.lookup(url) is None
+
+
+def test_load_local_file_first(cache, tmp_path):
+    # a previously downloaded (different) table for the same file
+    content = read_fixture().replace(b"3.118634503405621E-03", b"1.000000000000000E+00")
+    cache.add_to_index(BASEURL.format("sun.txt"), cache.store(content))
+
+    table = load_ephemeris("sun.txt", datadir=DATADIR, cache=cache)
+    assert np.array_equal(table, parse_ephemeris(read_fixture()))
+
+    # without the local file the cached table is used
+    table = load_ephemeris("sun.txt", datadir=str(tmp_path), cache=cache, offline=True)
+    assert table[0, 1] == 1.
+
+
+def test_load_data_environment_variable(cache, monkeypatch):
+    monkeypatch.setenv("SOLSYM_DATA", DATADIR)
+
+    table = load_ephemeris("sun.txt", cache=cache, offline=True)
+    assert np.array_equal(table, parse_ephemeris(read_fixture()))
+
+
+def test_load_offline_not_cached(cache, tmp_path):
+    with pytest.raises(IOError):
+        load_ephemeris("sun.txt", datadir=str(tmp_path), cache=cache, offline=True)
+
+
+def test_load_ephemerides(cache):
+    jpldata = load_ephemerides(["Sun"], datadir=DATADIR, cache=cache, offline=True)
+
+    assert list(jpldata.keys()) == ["Sun"]
+    assert jpldata["Sun"].shape == (3, 7)
@@ -0,0 +1,239 @@
+"""
+Tests of run_pulsars.py, with stand-ins for the enterprise, bilby and
+pulsar_likelihood modules (so neither they nor tempo2 are needed).
+"""
+
+import csv
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import run_pulsars
+from run_pulsars import _run, cached_tim, file_hash, filter_tim, read_tim, write_summary
+
+
+TIM = """FORMAT 1
+MODE 1
+C a comment
+puppi_56000.ff 1400.000 56000.1234567890123 0.500 ao -f L-wide_PUPPI -pta NANOGrav
+puppi_56001.ff 1400.000 56001.5000000000000 0.750 ao -f L-wide_PUPPI -pta NANOGrav
+asp_53000.ff 430.000 53000.2500000000000 1.000 ao -f 430_ASP -pta NANOGrav
+gasp_53001.ff 820.000 53001 2.000 gbt -be GASP
+"""
+
+PAR = """PSRJ J0030+0451
+F0 205.53069927493134 1 1e-12
+F1 -4.2976e-16 1 1e-20
+"""
+
+
+@pytest.fixture
+def pulsar(tmp_path):
+    parfile = tmp_path / "J0030+0451.par"
+    timfile = tmp_path / "J0030+0451.tim"
+    parfile.write_text(PAR)
+    timfile.write_text(TIM)
+    return str(parfile), str(timfile)
+
+
+class Param(object):
+    def __init__(self, val, err):
+        self.val = val
+        self.err = err
+
+
+class Result(object):
+    def __init__(self, posterior):
+        self.posterior = posterior
+
+
+@pytest.fixture
+def stack(monkeypatch):
+    """
+    Stand-in enterprise/bilby modules. The sampler returns (or raises) the
+    value of stack.result, and each call's arguments are recorded in
+    stack.calls.
+    """
+
+    stack = types.SimpleNamespace(calls=[], result=None)
+
+    class Pulsar(object):
+        def __init__(self, parfile, timfile, drop_t2pulsar=True):
+            stack.calls.append(("Pulsar", timfile))
+            self.name = os.path.splitext(os.path.basename(parfile))[0]
+            with open(timfile, "r") as fp:
+                self.toas = np.array([line for line in fp if line.startswith(("puppi", "asp", "gasp"))])
+            self.t2pulsar = {"F0": Param(np.longdouble("205.5"), 1e-12), "F1": Param(-4e-16, 1e-20)}
+
+    def run_sampler(**kwargs):
+        stack.calls.append(("run_sampler", kwargs))
+        if isinstance(stack.result, Exception):
+            raise stack.result
+        return stack.result
+
+    modules = {
+        "enterprise": types.ModuleType("enterprise"),
+        "enterprise.pulsar": types.ModuleType("enterprise.pulsar"),
+        "enterprise_extensions": types.ModuleType("enterprise_extensions"),
+        "enterprise_extensions.models": types.ModuleType("enterprise_extensions.models"),
+        "enterprise_warp": types.ModuleType("enterprise_warp"),
+        "enterprise_warp.bilby_warp": types.ModuleType("enterprise_warp.bilby_warp"),
+        "bilby": types.ModuleType("bilby"),
+        "pulsar_likelihood": types.ModuleType("pulsar_likelihood"),
+    }
+    modules["enterprise.pulsar"].Pulsar = Pulsar
+    modules["enterprise_extensions.models"].model_singlepsr_noise = lambda psr, **kwargs: "pta"
+    modules["enterprise_warp"].bilby_warp = modules["enterprise_warp.bilby_warp"]
+    modules["enterprise_warp.bilby_warp"].get_bilby_prior_dict = lambda pta: {"F0": None, "F1": None}
+    modules["bilby"].run_sampler = run_sampler
+    modules["pulsar_likelihood"].TaylorTimingLikelihood = lambda pta, parameters: "likelihood"
+
+    for name, module in modules.items():
+        monkeypatch.setitem(sys.modules, name, module)
+
+    return stack
+
+
+def test_filter_tim():
+    lines = TIM.splitlines(keepends=True)
+    assert filter_tim(TIM, "L-wide_PUPPI") == lines[:5]
+
+    # bytes contents
+    assert filter_tim(TIM.encode(), "430_ASP") == [line.encode() for line in lines[:3] + lines[5:6]]
+
+    # no filtering
+    assert filter_tim(TIM) == TIM.splitlines(keepends=True)
+
+
+def test_read_tim(pulsar, tmp_path):
+    _, timfile = pulsar
+    lines = [line.encode() for line in TIM.splitlines(keepends=True)]
+    assert read_tim(timfile, "L-wide_PUPPI") == lines[:5]
+
+    # included files are read relative to the including file, and filtered
+    (tmp_path / "extra").mkdir()
+    (tmp_path / "extra" / "more.tim").write_text("C more\nINCLUDE ../J0030+0451.tim\nnew_56002.ff 1400.000 56002.5 0.5 ao -f L-wide_PUPPI")
+    (tmp_path / "main.tim").write_text("FORMAT 1\ninclude extra/more.tim\nnew_56003.ff 1400.000 56003.5 0.5 ao -f 430_ASP\n")
+
+    assert read_tim(str(tmp_path / "main.tim"), "L-wide_PUPPI") == [
+        b"FORMAT 1\n", b"C more\n"
+    ] + lines[:5] + [
+        b"new_56002.ff 1400.000 56002.5 0.5 ao -f L-wide_PUPPI\n",
+    ]
+
+
+def test_cached_tim(pulsar, tmp_path):
+    parfile, timfile = pulsar
+    cachedir = str(tmp_path / "cache")
+
+    cachedtim = cached_tim(parfile, timfile, backend="L-wide_PUPPI", cachedir=cachedir)
+
+    filtered = "".join(filter_tim(TIM, "L-wide_PUPPI"))
+    key = file_hash(parfile, extra=(filtered + "L-wide_PUPPI").encode())
+    assert cachedtim == os.path.join(cachedir, key + ".tim")
+
+    with open(cachedtim, "r") as fp:
+        assert fp.read() == filtered
+
+    # reused (not rewritten) for the same files and backend
+    mtime = os.path.getmtime(cachedtim)
+    assert cached_tim(parfile, timfile, backend="L-wide_PUPPI", cachedir=cachedir) == cachedtim
+    assert os.path.getmtime(cachedtim) == mtime
+
+    # a different backend, or a change to either file, gives a new entry
+    assert cached_tim(parfile, timfile, backend="430_ASP", cachedir=cachedir) != cachedtim
+    assert cached_tim(parfile, timfile, cachedir=cachedir) != cachedtim
+
+    with open(parfile, "a") as fp:
+        fp.write("F2 0\n")
+    newtim = cached_tim(parfile, timfile, backend="L-wide_PUPPI", cachedir=cachedir)
+    assert newtim != cachedtim
+
+    with open(timfile, "a") as fp:
+        fp.write("puppi_56002.ff 1400.000 56002.5 0.5 ao -f L-wide_PUPPI\n")
+    newtim = cached_tim(parfile, timfile, backend="L-wide_PUPPI", cachedir=cachedir)
+    assert newtim != cachedtim
+
+    # but not a change to TOAs from other backends
+    with open(timfile, "a") as fp:
+        fp.write("asp_53002.ff 430.000 53002.5 1.0 ao -f 430_ASP\n")
+    assert cached_tim(parfile, timfile, backend="L-wide_PUPPI", cachedir=cachedir) == newtim
+
+    assert len(os.listdir(cachedir)) == 5
+    assert not any(".tmp" in f for f in os.listdir(cachedir))
+
+
+def test_run(pulsar, stack, tmp_path):
+    parfile, timfile = pulsar
+    stack.result = Result({
+        "J0030+0451_timing model_tmparams_0": np.linspace(-1., 1., 101),
+        "J0030+0451_timing model_tmparams_1": np.zeros(101),
+    })
+
+    kwargs = {"backend": "L-wide_PUPPI", "cachedir": str(tmp_path / "cache"), "outdir": str(tmp_path / "results"), "nsamples": 10, "cores": 2}
+    summary = _run((parfile, timfile, kwargs))
+
+    assert summary["status"] == "ok"
+    assert summary["pulsar"] == "J0030+0451"
+    assert summary["ntoas"] == 2
+    assert (summary["parfile"], summary["timfile"]) == (parfile, timfile)
+
+    # the cached (filtered) .tim file is used for the pulsar
+    assert stack.calls[0] == ("Pulsar", cached_tim(parfile, timfile, "L-wide_PUPPI", kwargs["cachedir"]))
+
+    sampler = stack.calls[1][1]
+    assert sampler["nsamples"] == 10
+    assert sampler["npool"] == 2
+    assert sampler["outdir"] == os.path.join(kwargs["outdir"], "J0030+0451")
+
+    # samples are converted to the true values (at long double precision)
+    assert summary["F0_median"] == np.longdouble("205.5")
+    assert isinstance(summary["F0_median"], np.longdouble)
+    assert summary["F0_95%"] == np.longdouble("205.5") + np.longdouble(0.9) * 1e-12
+    assert summary["F1_std"] == 0.
+
+
+def test_run_failures(pulsar, stack, tmp_path, monkeypatch):
+    parfile, timfile = pulsar
+    kwargs = {"cachedir": str(tmp_path / "cache"), "outdir": str(tmp_path / "results")}
+
+    stack.result = RuntimeError("sampler failed")
+    summary = _run((parfile, timfile, kwargs))
+
+    assert summary["status"] == "failed: sampler failed"
+    assert summary["pulsar"] == "J0030+0451"
+    assert (summary["parfile"], summary["timfile"]) == (parfile, timfile)
+    assert summary["wall_time"] >= 0.
+    assert "F0_median" not in summary
+
+    # missing files
+    summary = _run((parfile, str(tmp_path / "missing.tim"), kwargs))
+    assert summary["status"].startswith("failed: ")
+
+    # missing dependencies
+    monkeypatch.setitem(sys.modules, "bilby", None)
+    summary = _run((parfile, timfile, kwargs))
+    assert summary["status"].startswith("failed: ")
+
+
+def test_write_summary(tmp_path):
+    summaries = [
+        {"pulsar": "J0030+0451", "status": "ok", "ntoas": 2, "F0_median": np.longdouble("205.530699274931340001"), "wall_time": 1.5, "parfile": "a.par", "timfile": "a.tim"},
+        {"pulsar": "J1012+5307", "status": "failed: sampler failed", "wall_time": 0.1, "parfile": "b.par", "timfile": "b.tim"},
+    ]
+
+    filename = str(tmp_path / "summary.csv")
+    write_summary(filename, summaries)
+
+    with open(filename, "r", newline="") as fp:
+        rows = list(csv.DictReader(fp))
+
+    assert list(rows[0].keys()) == run_pulsars.SUMMARY_COLUMNS
+    assert rows[0]["pulsar"] == "J0030+0451"
+    assert rows[0]["ntoas"] == "2"
+    assert np.longdouble(rows[0]["F0_median"]) == summaries[0]["F0_median"]
+    assert rows[1]["status"] == "failed: sampler failed"
+    assert rows[1]["F0_median"] == ""
@@ -0,0 +1,232 @@
+"""
+Tests of sweep.py, using a stand-in (Python) script in place of the
+lalapps_pulsar_parameter_estimation executables.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+from sweep import Sweep, Task
+
+
+# copies its input file to an output directory, records when it ran, then
+# sleeps and exits with the given code
+SCRIPT = """
+import os
+import sys
+import time
+
+logdir, sleep, code = sys.argv[1], float(sys.argv[2]), int(sys.argv[3])
+start = time.time()
+
+with open("input.txt", "r") as fp:
+    content = fp.read()
+with open(os.path.join("output", "output.txt"), "w") as fp:
+    fp.write(content + os.environ.get("EXTRA", ""))
+
+print("stdout " + content)
+sys.stderr.write("stderr " + content)
+
+time.sleep(sleep)
+with open(os.path.join(logdir, os.path.basename(os.getcwd())), "w") as fp:
+    fp.write("{} {}".format(start, time.time()))
+
+sys.exit(code)
+"""
+
+
+@pytest.fixture
+def script(tmp_path):
+    path = tmp_path / "fakepe.py"
+    path.write_text(SCRIPT)
+    (tmp_path / "log").mkdir()
+    return str(path), str(tmp_path / "log")
+
+
+def make_task(script, name, sleep=0., code=0, **kwargs):
+    path, logdir = script
+    kwargs.setdefault("files", {"input.txt": name})
+    kwargs.setdefault("directories", ["output"])
+    return Task(name, [sys.executable, path, logdir, sleep, code], **kwargs)
+
+
+def read(*path):
+    with open(os.path.join(*path), "r") as fp:
+        return fp.read()
+
+
+def test_isolated_workdirs(script, tmp_path):
+    sweep = Sweep(str(tmp_path / "run"), nworkers=2)
+    tasks = [make_task(script, "task{}".format(i)) for i in range(4)]
+    tasks.append(make_task(script, "env", files={"input.txt": "env", "sub/other.bin": b"\x00"}, env={"EXTRA": " extra"}))
+
+    records = sweep.run(tasks, verbose=False)
+
+    assert [record["name"] for record in records] == [task.name for task in tasks]
+    for task, record in zip(tasks, records):
+        workdir = sweep.workdir(task.name)
+        assert record["workdir"] == workdir
+        assert record["returncode"] == 0
+
+        # each task read its own input and wrote to its own output directory
+        output = read(workdir, "output", "output.txt")
+        assert output == (task.name + " extra" if task.name == "env" else task.name)
+        assert read(workdir, "stdout") == "stdout {}\n".format(task.name)
+        assert read(workdir, "stderr") == "stderr {}".format(task.name)
+
+    with open(os.path.join(sweep.workdir("env"), "sub", "other.bin"), "rb") as fp:
+        assert fp.read() == b"\x00"
+
+
+def test_nworkers(script, tmp_path):
+    sleep, nworkers = 0.3, 2
+    sweep = Sweep(str(tmp_path / "run"), nworkers=nworkers)
+    tasks = [make_task(script, "task{}".format(i), sleep=sleep) for i in range(6)]
+
+    sweep.run(tasks, verbose=False)
+
+    # the times each task ran, as recorded by the script itself
+    intervals = [tuple(map(float, read(script[1], task.name).split())) for task in tasks]
+
+    # the maximum number of tasks running at the start of any task
+    running = max(sum(1 for s, e in intervals if s <= start < e) for start, _ in intervals)
+    assert running <= nworkers
+
+    # so the tasks must have run in (at least) three batches
+    assert max(e for _, e in intervals) - min(s for s, _ in intervals) >= 3 * sleep
+
+
+def test_records(script, tmp_path):
+    sweep = Sweep(str(tmp_path / "run"), nworkers=2)
+    tasks = [
+        make_task(script, "ok", sleep=0.2),
+        make_task(script, "fail", code=3),
+        make_task(script, "timeout", sleep=10., timeout=0.5),
+        Task("missing", [str(tmp_path / "does_not_exist")]),
+    ]
+
+    records = {record["name"]: record for record in sweep.run(tasks, verbose=False)}
+
+    assert records["ok"]["returncode"] == 0
+    assert "error" not in records["ok"]
+    assert records["ok"]["walltime"] >= 0.2
+    assert records["ok"]["walltime"] == pytest.approx(records["ok"]["end"] - records["ok"]["start"])
+    assert records["ok"]["command"] == tasks[0].command
+
+    assert records["fail"]["returncode"] == 3
+
+    assert records["timeout"]["returncode"] is None
+    assert records["timeout"]["error"] == "timed out after 0.5 s"
+    assert records["timeout"]["walltime"] < 10.
+
+    assert records["missing"]["returncode"] is None
+    assert "does_not_exist" in records["missing"]["error"]
+
+    # the records are written to the record file
+    assert sweep.records() == records
+    assert sweep.completed() == {"ok"}
+
+
+def test_setup_failures(script, tmp_path):
+    def fail(path):
+        raise RuntimeError("no input")
+
+    sweep = Sweep(str(tmp_path / "run"), nworkers=2)
+    tasks = [
+        make_task(script, "callable", files={"input.txt": fail}),
+        make_task(script, "oserror", files={"input.txt": "x", "input.txt/child": "y"}),
+        make_task(script, "ok"),
+    ]
+
+    records = sweep.run(tasks, verbose=False)
+
+    # the failed setups are recorded, and do not stop the other tasks
+    assert records[0]["returncode"] is None
+    assert records[0]["error"] == "setup failed: no input"
+    assert records[1]["returncode"] is None
+    assert records[1]["error"].startswith("setup failed: ")
+    assert "walltime" in records[1]
+    assert records[2]["returncode"] == 0
+    assert sweep.completed() == {"ok"}
+
+
+@pytest.mark.parametrize("path", ["/tmp/input.txt", "../input.txt", "a/../../input.txt", "", "."])
+def test_invalid_paths(path):
+    with pytest.raises(ValueError):
+        Task("task", ["true"], files={path: "x"})
+
+    with pytest.raises(ValueError):
+        Task("task", ["true"], directories=[path])
+
+
+@pytest.mark.parametrize("name", ["", ".", "..", "a/b"])
+def test_invalid_names(name):
+    with pytest.raises(ValueError):
+        Task(name, ["true"])
+
+
+def test_restart(script, tmp_path):
+    sweep = Sweep(str(tmp_path / "run"), nworkers=2)
+    tasks = [make_task(script, "ok"), make_task(script, "fail", code=1)]
+    first = sweep.run(tasks, verbose=False)
+
+    # a partially written record (e.g., from a killed sweep) is ignored
+    with open(sweep.recordfile, "a") as fp:
+        fp.write('{"name": "ok", "ret')
+
+    # only the failed task is re-run (now successfully)
+    tasks[1] = make_task(script, "fail")
+    second = Sweep(sweep.rundir, nworkers=2).run(tasks, verbose=False)
+
+    assert second[0] == first[0]
+    assert second[1]["returncode"] == 0
+    assert second[1]["start"] > first[1]["start"]
+
+    with open(sweep.recordfile, "r") as fp:
+        names = [json.loads(line)["name"] for line in fp if line.endswith("}\n")]
+    assert sorted(names) == ["fail", "fail", "ok"]
+
+    assert sweep.completed() == {"ok", "fail"}
+
+
+def test_restart_changed_inputs(script, tmp_path):
+    sweep = Sweep(str(tmp_path / "run"), nworkers=2)
+    data = {"text": "a", "callable": "b", "command": "c", "same": "d"}
+
+    def write(path):
+        with open(path, "w") as fp:
+            fp.write(data["callable"])
+
+    def tasks():
+        return [
+            make_task(script, "text", files={"input.txt": data["text"]}),
+            make_task(script, "callable", files={"input.txt": write}),
+            make_task(script, "command", env={"EXTRA": data["command"]}),
+            make_task(script, "same"),
+        ]
+
+    first = sweep.run(tasks(), verbose=False)
+    assert all(record["returncode"] == 0 and "hash" in record for record in first)
+
+    # the same inputs are not run again, and their outputs are kept
+    assert sweep.run(tasks(), verbose=False) == first
+    assert read(sweep.workdir("text"), "output", "output.txt") == "a"
+
+    # tasks with changed input file contents (or commands/environments) are run again
+    data.update(text="A", callable="B", command="C")
+    second = sweep.run(tasks(), verbose=False)
+
+    assert [record["hash"] != previous["hash"] for record, previous in zip(second, first)] == [True, True, True, False]
+    assert second[3] == first[3]
+    assert read(sweep.workdir("text"), "output", "output.txt") == "A"
+    assert read(sweep.workdir("callable"), "output", "output.txt") == "B"
+    assert read(sweep.workdir("command"), "output", "output.txt") == "commandC"
+    assert not os.path.exists(os.path.join(sweep.rundir, ".setup"))
+
+    # records without a hash (or that failed) are run again
+    with open(sweep.recordfile, "a") as fp:
+        fp.write(json.dumps(dict(second[3], hash=None)) + "\n")
+    assert sweep.run(tasks(), verbose=False)[3]["start"] > second[3]["start"]